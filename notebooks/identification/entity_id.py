@@ -1,20 +1,34 @@
 """Entity Identification Module"""
 
 
+import asyncio
+import base64
+import hashlib
 import json
+import math
 import re
 import pprint
+import time
 import networkx as nx
 import matplotlib.pyplot as plt
 import pandas as pd
 import plotly.graph_objects as go
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from datetime import datetime, timezone
+from fnmatch import fnmatchcase
 from pathlib import Path
-from typing import Dict, List, Tuple
+from statistics import NormalDist
+from typing import Callable, Dict, List, Optional, Pattern, Tuple, Union
 from IPython.display import HTML, display
 from tqdm.auto import tqdm
 from msticpy.nbtools import nbwidgets
-from pyvis.network import Network
 
 
 DEF_REGEXES = {
@@ -22,16 +36,22 @@ DEF_REGEXES = {
         "regex": r"^((?=[a-z0-9-]{1,63}\.)[a-z0-9]+(-[a-z0-9]+)*\.){1,126}[a-z]{2,63}$",
         "priority": "1",
         "entity": "host",
+        "prefilter": {"contains": ["."], "min_length": 4},
+        "column_hints": ["*host*", "*domain*", "*dns*", "*fqdn*", "*computer*"],
     },
     "IPV4_REGEX": {
         "regex": r"^(?P<ipaddress>(?:[0-9]{1,3}\.){3}[0-9]{1,3})$",
         "priority": "0",
         "entity": "ipaddress",
+        "prefilter": {"contains": ["."], "min_length": 7, "max_length": 15},
+        "column_hints": ["*ipaddress*", "*ip", "*ipv4*", "*addr*"],
     },
     "IPV6_REGEX": {
         "regex": r"^(?<![:.\w])(?:[A-F0-9]{0,4}:){2,7}[A-F0-9]{0,4}(?![:.\w])$",
         "priority": "0",
         "entity": "ipaddress",
+        "prefilter": {"contains": [":"], "min_length": 2, "max_length": 39},
+        "column_hints": ["*ipaddress*", "*ip", "*ipv6*", "*addr*"],
     },
     "URL_REGEX": {
         "regex": r"""
@@ -47,21 +67,29 @@ DEF_REGEXES = {
             """,
         "priority": "0",
         "entity": "url",
+        "prefilter": {"contains": ["://"], "min_length": 6},
+        "column_hints": ["*url*", "*uri*", "*link*"],
     },
     "MD5_REGEX": {
         "regex": r"^(?:^|[^A-Fa-f0-9])(?P<hash>[A-Fa-f0-9]{32})(?:$|[^A-Fa-f0-9])$",
         "priority": "1",
         "entity": "hash",
+        "prefilter": {"min_length": 32, "max_length": 34},
+        "column_hints": ["*hash*", "*md5*"],
     },
     "SHA1_REGEX": {
         "regex": r"^(?:^|[^A-Fa-f0-9])(?P<hash>[A-Fa-f0-9]{40})(?:$|[^A-Fa-f0-9])$",
         "priority": "1",
         "entity": "hash",
+        "prefilter": {"min_length": 40, "max_length": 42},
+        "column_hints": ["*hash*", "*sha1*"],
     },
     "SHA256_REGEX": {
         "regex": r"^(?:^|[^A-Fa-f0-9])(?P<hash>[A-Fa-f0-9]{64})(?:$|[^A-Fa-f0-9])$",
         "priority": "1",
         "entity": "hash",
+        "prefilter": {"min_length": 64, "max_length": 66},
+        "column_hints": ["*hash*", "*sha256*"],
     },
     "LXPATH_REGEX": {
         "regex": r"""
@@ -71,6 +99,8 @@ DEF_REGEXES = {
             """,
         "priority": "2",
         "entity": "file",
+        "prefilter": {"contains": ["/"], "min_length": 2},
+        "column_hints": ["*path*", "*file*", "*folder*", "*directory*"],
     },
     "WINPATH_REGEX": {
         "regex": r"""
@@ -80,6 +110,8 @@ DEF_REGEXES = {
             """,
         "priority": "1",
         "entity": "file",
+        "prefilter": {"contains": ["\\"], "min_length": 2},
+        "column_hints": ["*path*", "*file*", "*folder*", "*directory*"],
     },
     "WINPROCESS_REGEX": {
         "regex": r"""
@@ -89,32 +121,50 @@ DEF_REGEXES = {
         """,
         "priority": "0",
         "entity": "process",
+        "prefilter": {"contains": [".exe"], "min_length": 5},
+        "column_hints": ["*process*", "*image*", "*exe*"],
     },
     "EMAIL_REGEX": {
         "regex": r"^[\w\d._%+-]+@(?:[\w\d-]+\.)+[\w]{2,}$",
         "priority": "0",
         "entity": "account",
+        "prefilter": {"contains": ["@", "."], "min_length": 6},
+        "column_hints": ["*email*", "*mail*", "*upn*", "*userprincipalname*", "*account*", "*user*"],
     },
     "RESOURCEID_REGEX": {
         "regex": r"(\/[a-z]+\/)[a-z0-9]{8}(-[a-z0-9]{4}){3}-[a-z0-9]{12}(\/[a-z]+\/).*",
         "priority": "0",
         "entity": "azureresource",
+        "prefilter": {"contains": ["/"], "min_length": 42},
+        "column_hints": ["*resourceid*", "*resource*"],
     },
     "NTACCT_REGEX": {
         "regex": r"^([^\/:*?\"<>|]){2,15}\\[^\/:*?\"<>|]{2,15}$",
         "priority": "0",
         "entity": "account",
+        "prefilter": {"contains": ["\\"], "min_length": 5},
+        "column_hints": ["*account*", "*user*", "*subject*", "*target*"],
+    },
+    "SID_REGEX": {
+        "regex": r"^S-[\d]+(-[\d]+)+$",
+        "priority": "1",
+        "entity": "account",
+        "prefilter": {"contains": ["s-"], "min_length": 5},
+        "column_hints": ["*sid*", "*securityid*"],
     },
-    "SID_REGEX": {"regex": r"^S-[\d]+(-[\d]+)+$", "priority": "1", "entity": "account"},
     "REGKEY_REGEX": {
         "regex": r"""("|'|\s)?(?P<hive>HKLM|HKCU|HKCR|HKU|HKEY_(LOCAL_MACHINE|USERS|CURRENT_USER|CURRENT_CONFIG|CLASSES_ROOT))(?P<key>(\\[^"'\\/]+){1,}\\?)("|'|\s)?""",
         "priority": "1",
         "entity": "registrykey",
+        "prefilter": {"contains": ["hk", "\\"], "min_length": 5},
+        "column_hints": ["*registry*", "*regkey*", "*key*"],
     },
     "GUID_REGEX": {
         "regex": r"^[a-z0-9]{8}(-[a-z0-9]{4}){3}-[a-z0-9]{12}$",
         "priority": "1",
         "data_format": "uuid",
+        "prefilter": {"contains": ["-"], "min_length": 36, "max_length": 36},
+        "column_hints": ["*guid*", "*id"],
     },
 }
 
@@ -124,6 +174,41 @@ QUERY_TEMP = """
 | where {ColumnName} == "{{MySearch}}"
 """
 
+# Column added by union sample queries to identify the source table
+SAMPLE_SOURCE_COL = "_SourceTable"
+# Query result row limit, larger union samples are split into more queries
+MAX_RESULT_ROWS = 500000
+# Schema column types that can hold string values
+STRING_COLUMN_TYPES = {"string", "dynamic", "guid"}
+# Kusto names of .NET schema types, as used in the column names union renames to
+DOTNET_TYPES = {
+    "boolean": "bool",
+    "sbyte": "bool",
+    "int32": "int",
+    "int64": "long",
+    "double": "real",
+    "single": "real",
+    "object": "dynamic",
+}
+# Maximum length of generated batch pivot queries, longer value lists are split
+MAX_QUERY_LENGTH = 60000
+# Batch pivots with more values than this join a datatable instead of using in~
+DATATABLE_THRESHOLD = 1000
+# Entities whose values are compared case-insensitively by pivot queries
+CASE_INSENSITIVE_ENTITIES = {
+    "account",
+    "azureresource",
+    "hash",
+    "host",
+    "ipaddress",
+    "process",
+    "registrykey",
+}
+# Estimated in-memory size in bytes of a sampled value, used before any rows are fetched
+ESTIMATED_VALUE_BYTES = 100
+# Columns added by batch pivot queries to identify the match
+MATCH_SOURCE_COLS = ["_SourceTable", "_MatchedColumn", "_MatchedValue"]
+
 
 def save_to_json_file(
     data: Dict,
@@ -166,7 +251,804 @@ def read_json_file(path: str):
         return json.load(f)
 
 
-def add_regex_def(name: str, regex: str, priority: str, entity: str):
+def _compile_re(regex: str) -> Pattern:
+    """Compile a regex with the standard library re engine."""
+    return re.compile(regex, re.VERBOSE | re.IGNORECASE)
+
+
+def _compile_re2(regex: str):
+    """
+    Compile a regex with the linear-time RE2 engine.
+
+    RE2 has no verbose mode, so whitespace and comments are stripped first.
+    RE2 does not support lookarounds and backreferences, its \\w and \\d
+    classes are ASCII only and $ only matches at the end of the value.
+    """
+    try:
+        import re2  # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise ImportError(
+            "The re2 regex engine requires google-re2: pip install google-re2"
+        ) from err
+    options = re2.Options()
+    options.case_sensitive = False
+    options.log_errors = False
+    return re2.compile(_strip_verbose(regex), options)
+
+
+def _strip_verbose(regex: str) -> str:
+    """Remove the whitespace and comments of a verbose regex."""
+    stripped = []
+    in_class = False
+    pos = 0
+    while pos < len(regex):
+        char = regex[pos]
+        if char == "\\":
+            stripped.append(regex[pos : pos + 2])
+            pos += 2
+            continue
+        if in_class:
+            in_class = char != "]"
+            stripped.append(char)
+        elif char == "[":
+            in_class = True
+            stripped.append(char)
+            # "]" directly after "[" or "[^" is a literal
+            if regex[pos + 1 : pos + 2] == "^":
+                stripped.append("^")
+                pos += 1
+            if regex[pos + 1 : pos + 2] == "]":
+                stripped.append("]")
+                pos += 1
+        elif char == "#":
+            while pos < len(regex) and regex[pos] != "\n":
+                pos += 1
+        elif not char.isspace():
+            stripped.append(char)
+        pos += 1
+    return "".join(stripped)
+
+
+def _import_pyarrow(feature: str = "The arrow regex engine"):
+    """Return the pyarrow and pyarrow.compute modules."""
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.compute  # pylint: disable=import-outside-toplevel
+    except ImportError as err:
+        raise ImportError(f"{feature} requires pyarrow: pip install pyarrow") from err
+    return pyarrow, pyarrow.compute
+
+
+class ArrowRegex:
+    """
+    Regex evaluated on whole Arrow string arrays with pyarrow.compute.
+
+    Arrow uses RE2 syntax, so the same limitations as the re2 engine apply.
+    Single values (e.g. for partial matches) are matched with re.
+    """
+
+    def __init__(self, regex: str):
+        """Compile the regex, raising an error if Arrow does not support it."""
+        pyarrow, compute = _import_pyarrow()
+        # Anchor at the start like re.match
+        self.pattern = f"^(?:{_strip_verbose(regex)})"
+        compute.match_substring_regex(
+            pyarrow.array([""], type=pyarrow.string()), self.pattern, ignore_case=True
+        )
+        self._regex = _compile_re(regex)
+
+    def match(self, value: str):
+        """Match a single value."""
+        return self._regex.match(value)
+
+    def match_array(self, array):
+        """Return a boolean Arrow array of the values matching the regex."""
+        _, compute = _import_pyarrow()
+        return compute.match_substring_regex(array, self.pattern, ignore_case=True)
+
+
+def _to_arrow_strings(column):
+    """Return the column as an Arrow string array with nulls for non-string values."""
+    pyarrow, _ = _import_pyarrow()
+    try:
+        # No copy for Arrow-backed columns
+        return pyarrow.array(column, type=pyarrow.string(), from_pandas=True)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+        return pyarrow.array(
+            [value if isinstance(value, str) else None for value in column],
+            type=pyarrow.string(),
+        )
+
+
+def _count_arrow_matches(values, counts, compiled_regexes, max_length=None):
+    """
+    Count the blank values and the values matching each regex with Arrow kernels.
+
+    Parameters
+    ----------
+    values : pyarrow.StringArray
+        String values of a column, non-string values are null.
+    counts : pyarrow.Int64Array
+        Number of occurrences of each value, or None if each value occurs once.
+    compiled_regexes : Dict[str, Pattern]
+        Output of compile_regexes function with the arrow engine.
+    max_length : int, optional
+        Values longer than this are not matched, by default None
+
+    Returns
+    -------
+    Tuple[int, Dict[str, int]]
+        Number of blank values and {regex: number of matches} for regexes matching at least one value.
+    """
+    pyarrow, compute = _import_pyarrow()
+
+    def weighted_sum(mask):
+        if counts is None:
+            return compute.sum(mask).as_py() or 0
+        return compute.sum(compute.filter(counts, mask)).as_py() or 0
+
+    num_blanks = weighted_sum(compute.equal(compute.utf8_trim_whitespace(values), ""))
+    if max_length is not None:
+        # Don't let a single huge value stall the whole column
+        values = compute.if_else(
+            compute.less_equal(compute.utf8_length(values), max_length),
+            values,
+            pyarrow.scalar(None, type=pyarrow.string()),
+        )
+    py_values = None
+    match_counts = {}
+    for name, pattern in compiled_regexes.items():
+        if isinstance(pattern, ArrowRegex):
+            mask = pattern.match_array(values)
+        else:
+            # Regexes that Arrow does not support are matched value by value
+            if py_values is None:
+                py_values = values.to_pylist()
+            mask = pyarrow.array(
+                [value is not None and bool(pattern.match(value)) for value in py_values]
+            )
+        num_matches = weighted_sum(mask)
+        if num_matches > 0:
+            match_counts[name] = num_matches
+    return num_blanks, match_counts
+
+
+# Regex engines that can be selected by name in compile_regexes
+REGEX_ENGINES = {"re": _compile_re, "re2": _compile_re2, "arrow": ArrowRegex}
+
+
+def compile_regexes(
+    regexes: Dict, partial: bool = False, engine: Union[str, Callable] = "re"
+) -> Dict[str, Pattern]:
+    """
+    Compile regex definitions once so they can be reused for every column.
+
+    Parameters
+    ----------
+    regexes : Dict
+        Regex definitions in the DEF_REGEXES/regexes.json format.
+    partial : bool, optional
+        If True, strips the ^ and $ delimiters so the patterns match substrings, by default False
+    engine : Union[str, Callable], optional
+        Name of a regex engine in REGEX_ENGINES ("re", "re2" or "arrow"), or a function
+        compiling a verbose, case-insensitive regex to an object with a match
+        method, by default "re". Regexes that the engine cannot compile fall
+        back to the re engine.
+
+    Returns
+    -------
+    Dict[str, Pattern]
+        Compiled patterns keyed by regex name.
+    """
+    compile_regex = REGEX_ENGINES[engine] if isinstance(engine, str) else engine
+    compiled = {}
+    for name, regex_def in regexes.items():
+        regex = regex_def["regex"]
+        if partial:
+            # Strip off ^ and $ delimiters
+            regex = re.sub(r"^\s*\^(.*)\s*\$\s*$", r"\1", regex, flags=re.DOTALL)
+        try:
+            compiled[name] = compile_regex(regex)
+        except ImportError:
+            raise
+        except Exception as err:  # pylint: disable=broad-except
+            if compile_regex is _compile_re:
+                raise
+            print(f"warning: {name} not supported by regex engine ({err}), using re")
+            compiled[name] = _compile_re(regex)
+    return compiled
+
+
+def compile_scanner(regexes: Dict) -> Tuple[Pattern, Dict[str, str]]:
+    """
+    Combine the unanchored regexes into one scanner that finds every entity in a single pass.
+
+    Each regex becomes a named alternative of the scanner. The alternatives are
+    ordered by priority, so where several regexes match at the same position the
+    most specific one wins. Named groups inside the regexes are made non-capturing.
+
+    Parameters
+    ----------
+    regexes : Dict
+        Regex definitions in the DEF_REGEXES/regexes.json format.
+
+    Returns
+    -------
+    Tuple[Pattern, Dict[str, str]]
+        Compiled scanner and the regex name for each of its group names.
+    """
+    by_priority = sorted(
+        regexes.items(), key=lambda item: int(item[1].get("priority", 0))
+    )
+    alternatives = []
+    group_names = {}
+    for idx, (name, regex_def) in enumerate(by_priority):
+        # Strip off ^ and $ delimiters
+        regex = re.sub(r"^\s*\^(.*)\s*\$\s*$", r"\1", regex_def["regex"], flags=re.DOTALL)
+        regex = re.sub(r"\(\?P<\w+>", "(?:", regex)
+        group_names[f"r{idx}"] = name
+        alternatives.append(f"(?P<r{idx}>{regex})")
+    scanner = re.compile("|".join(alternatives), re.VERBOSE | re.IGNORECASE)
+    return scanner, group_names
+
+
+def compile_prefilters(regexes: Dict) -> Dict[str, Dict]:
+    """
+    Collect the prefilters declared in the regex definitions.
+
+    A prefilter describes structural requirements of any value that the regex can match:
+
+    - "contains": substrings (case-insensitive) that the value must contain
+    - "min_length": minimum length of the value
+    - "max_length": maximum length of the value
+
+    Parameters
+    ----------
+    regexes : Dict
+        Regex definitions in the DEF_REGEXES/regexes.json format.
+
+    Returns
+    -------
+    Dict[str, Dict]
+        Normalized prefilters keyed by regex name. Regexes without a prefilter are omitted.
+    """
+    prefilters = {}
+    for name, regex_def in regexes.items():
+        prefilter = regex_def.get("prefilter")
+        if not prefilter:
+            continue
+        prefilters[name] = {
+            "contains": [text.casefold() for text in prefilter.get("contains", [])],
+            "min_length": prefilter.get("min_length", 0),
+            "max_length": prefilter.get("max_length"),
+        }
+    return prefilters
+
+
+def compile_column_hints(regexes: Dict) -> Dict[str, List[str]]:
+    """
+    Collect the column name hints declared in the regex definitions.
+
+    Column hints are case-insensitive wildcard patterns of column names
+    that usually hold values matching the regex, e.g. "*ipaddress*".
+
+    Parameters
+    ----------
+    regexes : Dict
+        Regex definitions in the DEF_REGEXES/regexes.json format.
+
+    Returns
+    -------
+    Dict[str, List[str]]
+        Lower case patterns keyed by regex name. Regexes without hints are omitted.
+    """
+    return {
+        name: [pattern.lower() for pattern in regex_def["column_hints"]]
+        for name, regex_def in regexes.items()
+        if regex_def.get("column_hints")
+    }
+
+
+def evaluation_order(
+    column: str,
+    regex_names: List[str],
+    column_hints: Dict[str, List[str]],
+    regex_stats: Optional[Dict[str, List[int]]] = None,
+) -> List[str]:
+    """
+    Order the regexes by how likely they are to match a column.
+
+    Regexes with a column hint matching the column name come first,
+    then the regexes are sorted by their observed hit rate.
+
+    Parameters
+    ----------
+    column : str
+        Column name.
+    regex_names : List[str]
+        Names of the regexes to order.
+    column_hints : Dict[str, List[str]]
+        Output of compile_column_hints function.
+    regex_stats : Dict[str, List[int]], optional
+        [columns matched, columns evaluated] of each regex, by default None
+
+    Returns
+    -------
+    List[str]
+        Regex names in evaluation order.
+    """
+    column = column.lower()
+    regex_stats = regex_stats or {}
+
+    def sort_key(name):
+        hinted = any(
+            fnmatchcase(column, pattern) for pattern in column_hints.get(name, [])
+        )
+        hits, evaluations = regex_stats.get(name, (0, 0))
+        # Laplace smoothed hit rate, so unseen regexes are not ordered last
+        return not hinted, -(hits + 1) / (evaluations + 2)
+
+    return sorted(regex_names, key=sort_key)
+
+
+def _column_fingerprint(values) -> Tuple[Counter, str]:
+    """Return the length histogram and case-folded text of a column's string values."""
+    lengths = Counter(len(value) for value in values)
+    # Values are joined with a separator that no prefilter looks for
+    text = "\0".join(values).casefold()
+    return lengths, text
+
+
+def _prefilter_passes(prefilter: Dict, fingerprint: Tuple[Counter, str]) -> bool:
+    """Return False if no value with the given fingerprint can match the regex."""
+    lengths, text = fingerprint
+    min_length = prefilter["min_length"]
+    max_length = prefilter["max_length"]
+    # "$" also matches before a trailing newline so allow one extra character
+    if not any(
+        length >= min_length and (max_length is None or length - 1 <= max_length)
+        for length in lengths
+    ):
+        return False
+    return all(substring in text for substring in prefilter["contains"])
+
+
+def kql_string(value: str) -> str:
+    """Return a value as a KQL string literal."""
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+        .replace("\t", "\\t")
+    )
+    return f'"{escaped}"'
+
+
+def kql_name(name: str) -> str:
+    """Return a table or column name, quoted if it is not a plain identifier."""
+    if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+        return name
+    return "['" + name.replace("\\", "\\\\").replace("'", "\\'") + "']"
+
+
+def kql_datetime(value) -> str:
+    """Return a datetime, timestamp or date string as a KQL datetime literal in UTC."""
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    timestamp = timestamp.tz_convert("UTC")
+    # KQL datetimes have a precision of 100ns (one tick)
+    ticks = timestamp.microsecond * 10 + timestamp.nanosecond // 100
+    return f"datetime({timestamp.strftime('%Y-%m-%dT%H:%M:%S')}.{ticks:07d}Z)"
+
+
+def time_slices(start, end, slice_size) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+    """
+    Split the time window [start, end] into consecutive slices.
+
+    Each slice ends one tick (100ns) before the next one starts, so that
+    the inclusive "between" filters of the slices don't overlap. The last
+    slice ends at end, it is not followed by a slice holding only the
+    end instant (e.g. for a date-only end).
+
+    Parameters
+    ----------
+    start : datetime or str
+        Start of the time window.
+    end : datetime or str
+        End of the time window.
+    slice_size : timedelta or str
+        Duration of each slice, e.g. "1d" or "6h".
+
+    Returns
+    -------
+    List[Tuple[pd.Timestamp, pd.Timestamp]]
+        (start, end) of each slice in time order, in UTC.
+    """
+    start, end = (
+        pd.Timestamp(value).tz_localize("UTC")
+        if pd.Timestamp(value).tzinfo is None
+        else pd.Timestamp(value).tz_convert("UTC")
+        for value in (start, end)
+    )
+    step = pd.Timedelta(slice_size)
+    if step <= pd.Timedelta(0):
+        raise ValueError(f"slice_size must be positive, got {slice_size!r}")
+    tick = pd.Timedelta(100, "ns")
+    slices = []
+    while start <= end:
+        if start + step >= end:
+            slices.append((start, end))
+            break
+        slices.append((start, start + step - tick))
+        start += step
+    return slices
+
+
+def time_filter(start=None, end=None, time_column: str = "TimeGenerated") -> Optional[str]:
+    """Return a where clause restricting the time column to [start, end], or None if both are None."""
+    column = kql_name(time_column)
+    if start is not None and end is not None:
+        return f"| where {column} between ({kql_datetime(start)} .. {kql_datetime(end)})"
+    if start is not None:
+        return f"| where {column} >= {kql_datetime(start)}"
+    if end is not None:
+        return f"| where {column} <= {kql_datetime(end)}"
+    return None
+
+
+def pivot_query(
+    table: str,
+    columns: List[str],
+    search_value: str,
+    case_sensitive: bool = True,
+    start=None,
+    end=None,
+    project: Optional[List[str]] = None,
+    time_column: Optional[str] = "TimeGenerated",
+) -> str:
+    """
+    Return a query for the rows of a table where any of the columns equals the value.
+
+    The clauses are ordered so that the engine can prune data early: the
+    time filter first (partition pruning), then a has filter that can use
+    the term index, then the exact comparison and finally the projection.
+    The has filter is only added if the value starts and ends with a letter
+    or digit, so that every exact match also satisfies it.
+
+    Parameters
+    ----------
+    table : str
+        Table name.
+    columns : List[str]
+        Columns to search.
+    search_value : str
+        Value to search for.
+    case_sensitive : bool, optional
+        If False, compares with =~ instead of ==, by default True
+    start : datetime or str, optional
+        Start of the time window, by default None (unbounded)
+    end : datetime or str, optional
+        End of the time window, by default None (unbounded)
+    project : List[str], optional
+        Columns to return, by default all columns
+    time_column : str, optional
+        Column filtered by the time window, None for tables without one,
+        by default "TimeGenerated"
+
+    Returns
+    -------
+    str
+        KQL query.
+    """
+    value = kql_string(search_value)
+    clauses = [kql_name(table)]
+    if time_column:
+        clauses.append(time_filter(start, end, time_column))
+    if re.fullmatch(r"[A-Za-z0-9].*[A-Za-z0-9]", search_value, flags=re.DOTALL):
+        clauses.append(
+            "| where " + " or ".join(f"{kql_name(col)} has {value}" for col in columns)
+        )
+    operator = "==" if case_sensitive else "=~"
+    clauses.append(
+        "| where " + " or ".join(f"{kql_name(col)} {operator} {value}" for col in columns)
+    )
+    if project:
+        clauses.append("| project " + ", ".join(kql_name(col) for col in project))
+    return "\n".join(clause for clause in clauses if clause)
+
+
+def batch_pivot_query(
+    columns: List[Tuple[str, str]],
+    values: List[str],
+    cols: Optional[List[str]] = None,
+    use_datatable: bool = False,
+) -> str:
+    """
+    Return a union query searching the given table columns for any of the values.
+
+    Values are compared case-insensitively. Every result row is tagged with
+    the MATCH_SOURCE_COLS: its source table, the matched column and the
+    value of the matched column. Table and column names are quoted with
+    kql_name where needed.
+
+    Parameters
+    ----------
+    columns : List[Tuple[str, str]]
+        (table, column) pairs to search.
+    values : List[str]
+        Values to search for.
+    cols : List[str], optional
+        Columns to project in addition to MATCH_SOURCE_COLS, by default all columns
+    use_datatable : bool, optional
+        If True, joins a datatable of the values instead of using in~, by default False
+
+    Returns
+    -------
+    str
+        KQL query.
+    """
+    if use_datatable:
+        literals = ", ".join(kql_string(value.lower()) for value in values)
+        header = f"let _Values = datatable(_Key:string) [{literals}];"
+        branch = (
+            "(_Values\n| join kind=inner ({table}\n"
+            "| extend _Key = tolower(tostring({column}))) on _Key\n"
+            "| extend _MatchedValue = tostring({column})\n"
+            "| project-away _Key, _Key1"
+        )
+    else:
+        literals = ", ".join(kql_string(value) for value in values)
+        header = f"let _Values = dynamic([{literals}]);"
+        branch = (
+            "({table}\n| where {column} in~ (_Values)\n"
+            "| extend _MatchedValue = tostring({column})"
+        )
+    branches = [
+        branch.format(table=kql_name(table), column=kql_name(column))
+        + f"\n| extend _SourceTable = {kql_string(table)}, _MatchedColumn = {kql_string(column)})"
+        for table, column in columns
+    ]
+    query = f"{header}\nunion isfuzzy=true\n" + ",\n".join(branches)
+    project = ", ".join(MATCH_SOURCE_COLS + [kql_name(col) for col in cols or []])
+    return f"{query}\n| project {project}" if cols else f"{query}\n| project-reorder {project}"
+
+
+def chunk_values(values: List[str], max_length: int, separator_length: int = 2) -> List[List[str]]:
+    """
+    Split values into chunks whose KQL string literals fit in max_length characters.
+
+    Raises
+    ------
+    ValueError
+        If a single value doesn't fit.
+    """
+    chunks, chunk, length = [], [], 0
+    for value in values:
+        value_length = len(kql_string(value)) + separator_length
+        if value_length > max_length:
+            raise ValueError(f"Value is too long for a {max_length} character query: {value[:50]}...")
+        if length + value_length > max_length:
+            chunks.append(chunk)
+            chunk, length = [], 0
+        chunk.append(value)
+        length += value_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def sample_query(table: str, sample_size: str = "100", columns: Optional[List[str]] = None) -> str:
+    """
+    Build a query that samples a table.
+
+    Parameters
+    ----------
+    table : str
+        Table to sample.
+    sample_size : str, optional
+        Number of events/rows to sample, by default "100"
+    columns : List[str], optional
+        Columns to project, by default None (all columns)
+
+    Returns
+    -------
+    str
+        Sample query.
+    """
+    query = f"{table} | sample {sample_size}"
+    if columns:
+        query += f" | project {', '.join(columns)}"
+    return query
+
+
+def string_schema_columns(table_schema: Optional[Dict[str, str]]) -> List[str]:
+    """
+    Return the columns of a table schema that can hold string values.
+
+    Parameters
+    ----------
+    table_schema : Dict[str, str]
+        Schema of the table {column: type}.
+
+    Returns
+    -------
+    List[str]
+        Names of the string, dynamic and guid columns.
+    """
+    return [
+        col
+        for col, col_type in (table_schema or {}).items()
+        if _normalize_type(col_type) in STRING_COLUMN_TYPES
+    ]
+
+
+def _normalize_type(col_type) -> str:
+    """Return the Kusto name of a schema column type, e.g. "long" for "System.Int64"."""
+    col_type = str(col_type).lower().rsplit(".", 1)[-1]
+    return DOTNET_TYPES.get(col_type, col_type)
+
+
+def union_sample_query(
+    tables: List[str], sample_size: str = "100", columns: Optional[Dict[str, List[str]]] = None
+) -> str:
+    """
+    Build a single query that samples several tables.
+
+    Parameters
+    ----------
+    tables : List[str]
+        Tables to sample.
+    sample_size : str, optional
+        Number of events/rows in each table to sample, by default "100"
+    columns : Dict[str, List[str]], optional
+        Columns to project for each table, by default None (all columns)
+
+    Returns
+    -------
+    str
+        Union query with a SAMPLE_SOURCE_COL column holding the source table.
+    """
+    subqueries = [
+        f"({sample_query(table, sample_size, (columns or {}).get(table))})"
+        for table in tables
+    ]
+    return f"union withsource={SAMPLE_SOURCE_COL}\n" + ",\n".join(subqueries)
+
+
+def split_union_results(
+    data: pd.DataFrame, tables: List[str], schema: Optional[Dict] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Split the result of a union_sample_query into one DataFrame per table.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Result of the union query.
+    tables : List[str]
+        Tables included in the union query.
+    schema : Dict, optional
+        Query provider schema {table: {column: type}} used to select and
+        rename the columns of each table, by default None
+
+    Returns
+    -------
+    Dict[str, pd.DataFrame]
+        Sampled rows keyed by table, with a fresh index.
+    """
+    results = {}
+    for table in tables:
+        table_df = data[data[SAMPLE_SOURCE_COL] == table].drop(columns=SAMPLE_SOURCE_COL)
+        table_schema = (schema or {}).get(table)
+        if table_schema:
+            # union renames columns that have different types in different
+            # tables to <column>_<type>
+            col_names = {}
+            for col, col_type in table_schema.items():
+                if col in table_df.columns:
+                    col_names[col] = col
+                elif f"{col}_{_normalize_type(col_type)}" in table_df.columns:
+                    col_names[f"{col}_{_normalize_type(col_type)}"] = col
+            table_df = table_df[list(col_names)].rename(columns=col_names)
+        else:
+            # Without a schema, drop the columns belonging to other tables
+            table_df = table_df.dropna(axis="columns", how="all")
+        results[table] = table_df.reset_index(drop=True)
+    return results
+
+
+def union_batches(tables: List[str], batch_size: int = 1, sample_size: str = "100") -> List[List[str]]:
+    """
+    Split tables into batches sampled by one union query each.
+
+    Batches are capped so that batch_size * sample_size stays under
+    MAX_RESULT_ROWS, and have at least one table.
+    """
+    batch_size = max(1, min(batch_size, MAX_RESULT_ROWS // max(1, int(sample_size))))
+    return [tables[i : i + batch_size] for i in range(0, len(tables), batch_size)]
+
+
+def sample_tables(
+    qry_prov,
+    tables: List[str],
+    sample_size: str = "100",
+    batch_size: int = 1,
+    columns: Optional[Dict[str, List[str]]] = None,
+):
+    """
+    Query a sample of each table, batch_size tables per union query (see sample_batch).
+
+    Yields
+    ------
+    Tuple[str, DataFrame]
+        Table name and sampled rows, in table order.
+    """
+    for batch in union_batches(tables, batch_size, sample_size):
+        yield from sample_batch(qry_prov, batch, sample_size, columns)
+
+
+def sample_batch(
+    qry_prov, tables: List[str], sample_size: str = "100", columns: Optional[Dict[str, List[str]]] = None
+) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    Query a sample of a batch of tables with one union query.
+
+    Falls back to a query per table if the union query fails,
+    for example because the result exceeds the response size limits.
+
+    Parameters
+    ----------
+    qry_prov : QueryProvider
+        Azure Sentinel query provider.
+    tables : List[str]
+        Tables to sample.
+    sample_size : str, optional
+        Number of events/rows in each table to sample, by default "100"
+    columns : Dict[str, List[str]], optional
+        Columns to project for each table, by default None (all columns)
+
+    Returns
+    -------
+    List[Tuple[str, DataFrame]]
+        Table name and sampled rows for each table.
+    """
+    if len(tables) > 1:
+        try:
+            data = qry_prov.exec_query(union_sample_query(tables, sample_size, columns))
+        except Exception:  # pylint: disable=broad-except
+            data = None
+        if isinstance(data, pd.DataFrame) and SAMPLE_SOURCE_COL in data.columns:
+            return list(split_union_results(data, tables, qry_prov.schema).items())
+    return [
+        (table, qry_prov.exec_query(sample_query(table, sample_size, (columns or {}).get(table))))
+        for table in tables
+    ]
+
+
+def _wilson_interval(successes: int, trials: int, z: float) -> Tuple[float, float]:
+    """Return the Wilson score confidence interval of a binomial proportion."""
+    if trials <= 0:
+        return 0.0, 1.0
+    ratio = successes / trials
+    denominator = 1 + z ** 2 / trials
+    centre = (ratio + z ** 2 / (2 * trials)) / denominator
+    margin = (
+        z * math.sqrt(ratio * (1 - ratio) / trials + z ** 2 / (4 * trials ** 2))
+        / denominator
+    )
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def add_regex_def(
+    name: str,
+    regex: str,
+    priority: str,
+    entity: str,
+    prefilter: Optional[Dict] = None,
+    column_hints: Optional[List[str]] = None,
+):
     """
     Add additional regexes to the JSON file.
 
@@ -180,77 +1062,1170 @@ def add_regex_def(name: str, regex: str, priority: str, entity: str):
         Regex priority.
     entity : str
         Entity corresponding to the regex.
+    prefilter : Dict, optional
+        Structural requirements used to skip columns that cannot match,
+        e.g. {"contains": ["@"], "min_length": 6}, by default None
+    column_hints : List[str], optional
+        Wildcard patterns of column names likely to match the regex,
+        e.g. ["*email*"], by default None
     """    
     with open("regexes.json") as json_file:
         data = json.load(json_file)
         y = {name: {"regex": regex, "priority": priority, "entity": entity}}
+        if prefilter:
+            y[name]["prefilter"] = prefilter
+        if column_hints:
+            y[name]["column_hints"] = column_hints
         data.update(y)
     with open("regexes.json", "w") as f:
         json.dump(data, f)
 
 
-class EntityIdentifier:
-    """Class for identifying entities in the tables of an Azure Sentinel workspace."""    
+# Columns of the match results store, one row per (table, column, regex) match
+MATCH_COLUMNS = ["table", "column", "regex", "entity", "priority", "ratio", "total_ratio"]
+
+
+def matches_to_frame(regex_matches: Dict, regexes: Dict) -> pd.DataFrame:
+    """
+    Convert nested regex matches to the columnar match results store.
+
+    Parameters
+    ----------
+    regex_matches : Dict
+        Dict structure is {table: {column: {regex: (non-blank-matches, all-matches)}}}
+    regexes : Dict
+        Regex definitions in the DEF_REGEXES/regexes.json format.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per match with MATCH_COLUMNS. The table, column, regex and entity
+        columns are categorical, the table categories include tables without matches.
+        Regexes without an entity have a missing entity.
+    """
+    records = [
+        (
+            table,
+            col,
+            regex,
+            regexes.get(regex, {}).get("entity"),
+            int(regexes.get(regex, {}).get("priority", 0)),
+            ratios[0],
+            ratios[1],
+        )
+        for table, cols in regex_matches.items()
+        for col, matches in cols.items()
+        for regex, ratios in matches.items()
+    ]
+    frame = pd.DataFrame.from_records(records, columns=MATCH_COLUMNS)
+    return frame.astype(
+        {
+            "table": pd.CategoricalDtype(list(regex_matches)),
+            "column": "category",
+            "regex": "category",
+            "entity": "category",
+            "priority": "int8",
+            "ratio": "float64",
+            "total_ratio": "float64",
+        }
+    )
+
+
+def frame_to_matches(frame: pd.DataFrame) -> Dict[str, Dict[str, Dict[str, Tuple[float, float]]]]:
+    """
+    Convert the columnar match results store back to nested regex matches.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Dict[str, Tuple(float, float)]]]
+        {table: {column: {regex: (non-blank-matches, all-matches)}}}
+    """
+    regex_matches = {table: {} for table in frame["table"].cat.categories}
+    for table, col, regex, ratio, total_ratio in zip(
+        frame["table"], frame["column"], frame["regex"], frame["ratio"], frame["total_ratio"]
+    ):
+        regex_matches[table].setdefault(col, {})[regex] = (ratio, total_ratio)
+    return regex_matches
+
+
+def interpret_match_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Select the match assigning an entity to each column.
+
+    GUID matches are ignored. The regex with the highest non-blank match
+    ratio wins, ties are decided by priority (0 is the highest) and then
+    by the order of the matches.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Output of matches_to_frame function.
+
+    Returns
+    -------
+    pd.DataFrame
+        The winning match of every column with at least one non-GUID match,
+        in the original table and column order.
+
+    Examples
+    --------
+    A tie for the highest ratio is decided between the tied regexes only.
+    The original interpret_matches loop returned the highest priority regex
+    seen so far instead, here IPV4_REGEX ("ipaddress") despite its lower ratio.
+
+    >>> matches = {"T": {"c": {"IPV4_REGEX": (0.5, 0.5), "DNS_REGEX": (0.9, 0.9),
+    ...                        "LXPATH_REGEX": (0.9, 0.9)}}}
+    >>> winners = interpret_match_frame(matches_to_frame(matches, DEF_REGEXES))
+    >>> winners[["regex", "entity"]].values.tolist()
+    [['DNS_REGEX', 'host']]
+    """
+    candidates = frame[frame["regex"] != "GUID_REGEX"]
+    ranked = candidates.sort_values(
+        ["ratio", "priority"], ascending=[False, True], kind="stable"
+    )
+    winners = ranked.drop_duplicates(["table", "column"])
+    return winners.sort_index()
+
+
+# Version of the binary results format, stored in the file metadata
+RESULTS_FORMAT_VERSION = "1"
+RESULTS_FORMATS = {".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow", ".parquet": "parquet"}
+
+
+def write_results_file(frame: pd.DataFrame, assigned: pd.Series, path: str):
+    """
+    Write the match results store to an Arrow IPC or Parquet file.
+
+    Each table is written as its own record batch (Arrow IPC) or row
+    group (Parquet), so that a single table can be read back without
+    reading the rest of the file. The file metadata holds the format
+    version and the batch/row group index of every table.
+
+    Parameters
+    ----------
+    frame : pd.DataFrame
+        Output of matches_to_frame function.
+    assigned : pd.Series
+        Boolean mask of the matches assigning the entity of their column.
+    path : str
+        File path, the format is chosen by the suffix (.arrow, .feather, .ipc or .parquet).
+    """
+    pyarrow, _ = _import_pyarrow("Binary results files")
+    file_format = RESULTS_FORMATS[Path(path).suffix.lower()]
+    tables = list(frame["table"].cat.categories)
+    frame = frame.assign(assigned=assigned.to_numpy()).sort_values(
+        "table", kind="stable"
+    )
+    # Convert once so every batch shares the same dictionaries
+    data = pyarrow.Table.from_pandas(frame, preserve_index=False)
+    counts = frame["table"].value_counts(sort=False).reindex(tables)
+    # Batch/row group index of each table, tables without matches have none
+    parts, slices = {}, []
+    for table, count, end in zip(tables, counts, counts.cumsum()):
+        parts[table] = len(slices) if count else None
+        if count:
+            slices.append(data.slice(end - count, count))
+    metadata = {
+        "asdet_results_version": RESULTS_FORMAT_VERSION,
+        "tables": json.dumps(parts),
+    }
+    data = data.replace_schema_metadata(metadata)
+    if file_format == "arrow":
+        import pyarrow.ipc  # pylint: disable=import-outside-toplevel
+
+        with pyarrow.ipc.new_file(path, data.schema) as writer:
+            for table_slice in slices:
+                writer.write_table(table_slice, max_chunksize=len(table_slice))
+    else:
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+
+        with pyarrow.parquet.ParquetWriter(path, data.schema) as writer:
+            for table_slice in slices:
+                writer.write_table(table_slice, row_group_size=len(table_slice))
+
+
+def read_results_file(
+    path: str, tables: Optional[List[str]] = None
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Read a results file written by write_results_file.
+
+    Arrow IPC files are memory-mapped and only the record batches of the
+    requested tables are read. Parquet files only read the requested row groups.
+
+    Parameters
+    ----------
+    path : str
+        File path.
+    tables : List[str], optional
+        Tables to read, by default all tables
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, pd.Series]
+        Match results store (see matches_to_frame) and the boolean mask of
+        the matches assigning the entity of their column.
+
+    Raises
+    ------
+    ValueError
+        If the file was written with an unsupported format version.
+    """
+    pyarrow, _ = _import_pyarrow("Binary results files")
+    file_format = RESULTS_FORMATS[Path(path).suffix.lower()]
+    if file_format == "arrow":
+        import pyarrow.ipc  # pylint: disable=import-outside-toplevel
+
+        reader = pyarrow.ipc.open_file(pyarrow.memory_map(path))
+        metadata = reader.schema.metadata or {}
+        get_part, read_all, schema = reader.get_batch, reader.read_all, reader.schema
+    else:
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+
+        reader = pyarrow.parquet.ParquetFile(path, memory_map=True)
+        metadata = reader.schema_arrow.metadata or {}
+        get_part, read_all, schema = (
+            reader.read_row_group,
+            reader.read,
+            reader.schema_arrow,
+        )
+    version = metadata.get(b"asdet_results_version", b"").decode()
+    if version != RESULTS_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported results format version {version!r} in {path}, "
+            f"expected {RESULTS_FORMAT_VERSION!r}"
+        )
+    all_tables = json.loads(metadata[b"tables"])
+    if tables is None:
+        tables = list(all_tables)
+        data = read_all()
+    else:
+        tables = [table for table in tables if table in all_tables]
+        parts = [
+            get_part(all_tables[table])
+            for table in tables
+            if all_tables[table] is not None
+        ]
+        if file_format == "arrow":
+            parts = [pyarrow.Table.from_batches([batch]) for batch in parts]
+        data = pyarrow.concat_tables(parts) if parts else schema.empty_table()
+    frame = data.to_pandas()
+    frame["table"] = pd.Categorical(frame["table"].astype(object), categories=tables)
+    assigned = frame.pop("assigned").astype(bool)
+    return frame.astype({"priority": "int8"}), assigned
+
+
+# Compiled regexes, prefilters and value length cap of a regex matching worker process
+_WORKER_REGEXES: Dict[str, Pattern] = {}
+_WORKER_PREFILTERS: Dict[str, Dict] = {}
+_WORKER_MAX_LENGTH: Optional[int] = None
+
+
+def _init_match_worker(
+    regexes: Dict, engine: Union[str, Callable] = "re", max_length: Optional[int] = None
+):
+    """Compile the regexes once per worker process."""
+    global _WORKER_REGEXES, _WORKER_PREFILTERS, _WORKER_MAX_LENGTH
+    _WORKER_REGEXES = compile_regexes(regexes, engine=engine)
+    _WORKER_PREFILTERS = compile_prefilters(regexes)
+    _WORKER_MAX_LENGTH = max_length
+
+
+def _count_matches_worker(value_counts: List[Tuple[str, int]]) -> Tuple[int, Dict[str, int]]:
+    """Count the blanks and regex matches of a single column in a worker process."""
+    return EntityIdentifier._count_matches(
+        value_counts, _WORKER_REGEXES, _WORKER_PREFILTERS, _WORKER_MAX_LENGTH
+    )
+
+
+class MatchAccumulator:
+    """
+    Raw regex match counters that can be updated chunk by chunk and merged.
+
+    Counts are kept per (table, column, regex) so that results of several
+    chunks, pages or parallel workers can be added together. Ratios are
+    only computed by regex_matches.
+    """
+
+    def __init__(self):
+        """Instantiate an empty accumulator."""
+        # Dict structure is {table: {column: [rows, blanks, Counter({regex: matches})]}}
+        self.counts: Dict[str, Dict[str, List]] = {}
+
+    def add_table(self, table: str):
+        """Register a table, so it is reported even if no column matches."""
+        self.counts.setdefault(table, {})
+
+    def add(
+        self,
+        table: str,
+        column: str,
+        num_rows: int,
+        num_blanks: int,
+        match_counts: Dict[str, int],
+    ):
+        """
+        Add the counts of a chunk of a column.
+
+        Parameters
+        ----------
+        table : str
+            Table name.
+        column : str
+            Column name.
+        num_rows : int
+            Number of rows in the chunk.
+        num_blanks : int
+            Number of blank string values in the chunk.
+        match_counts : Dict[str, int]
+            Number of matches in the chunk for each regex.
+        """
+        counts = self.counts.setdefault(table, {}).setdefault(
+            column, [0, 0, Counter()]
+        )
+        counts[0] += num_rows
+        counts[1] += num_blanks
+        counts[2].update(match_counts)
+
+    def merge(self, other: "MatchAccumulator") -> "MatchAccumulator":
+        """
+        Add the counts of another accumulator, e.g. from a parallel worker.
+
+        Returns
+        -------
+        MatchAccumulator
+            This accumulator.
+        """
+        for table, cols in other.counts.items():
+            self.add_table(table)
+            for col, (num_rows, num_blanks, match_counts) in cols.items():
+                self.add(table, col, num_rows, num_blanks, match_counts)
+        return self
+
+    def regex_matches(self) -> Dict[str, Dict[str, Dict[str, Tuple[float, float]]]]:
+        """
+        Return the match ratios of the accumulated counts.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Dict[str, Tuple(float, float)]]]
+            {table: {column: {regex: (non-blank-matches, all-matches)}}}
+        """
+        regex_matches = {}
+        for table, cols in self.counts.items():
+            regex_matches[table] = {}
+            for col, (num_rows, num_blanks, match_counts) in cols.items():
+                col_matches = EntityIdentifier._match_ratios(
+                    num_rows, num_blanks, match_counts
+                )
+                if col_matches:
+                    regex_matches[table][col] = col_matches
+        return regex_matches
+
+
+class EntityValueIndex:
+    """
+    Inverted index of the values seen in sampled tables.
+
+    Maps each normalized (stripped, case-folded) value to the table columns
+    it was seen in, with its count and first/last seen times. Tables whose
+    sample returned fewer rows than requested were sampled completely, a
+    value missing from their columns therefore rules the table out until
+    the sample is older than max_age, since the table may have grown.
+    """
+
+    # Version of the persisted index format
+    VERSION = 1
+
+    def __init__(self, max_age: float = 3600):
+        """
+        Instantiate an empty index.
+
+        Parameters
+        ----------
+        max_age : float, optional
+            Age in seconds after which a complete sample no longer rules
+            tables out, by default 3600
+        """
+        self.max_age = max_age
+        # Dict structure is {value: {(table, column): [count, first_seen, last_seen]}}
+        self.values: Dict[str, Dict[Tuple[str, str], List]] = defaultdict(dict)
+        # Dict structure is {table: {"rows": int, "complete": bool, "sampled_at": str}}
+        self.tables: Dict[str, Dict] = {}
+
+    @staticmethod
+    def normalize(value: str) -> str:
+        """Return the normalized form of a value used as index key."""
+        return value.strip().casefold()
+
+    def add_sample(
+        self,
+        table: str,
+        sample: pd.DataFrame,
+        columns: List[str],
+        sample_size: Optional[int] = None,
+    ):
+        """
+        Add the values of a sampled table to the index.
+
+        Parameters
+        ----------
+        table : str
+            Table name.
+        sample : pd.DataFrame
+            Sampled rows. First and last seen times are taken from the
+            TimeGenerated column if present, or else the sampling time.
+        columns : List[str]
+            String columns to index.
+        sample_size : int, optional
+            Number of requested rows, a smaller sample covers the whole
+            table, by default None (never complete)
+        """
+        sampled_at = datetime.now(timezone.utc).isoformat()
+        complete = sample_size is not None and len(sample) < sample_size
+        if table in self.tables:
+            # Values of earlier samples are kept, so only a complete sample stays complete
+            complete = complete and self.tables[table]["complete"]
+        self.tables[table] = {
+            "rows": len(sample),
+            "complete": complete,
+            "sampled_at": sampled_at,
+        }
+        if "TimeGenerated" in sample:
+            times = pd.to_datetime(sample["TimeGenerated"], utc=True, errors="coerce")
+        else:
+            times = pd.Series(pd.Timestamp(sampled_at), index=sample.index)
+        for col in columns:
+            is_str = sample[col].map(lambda value: isinstance(value, str)).to_numpy(bool)
+            values = pd.Series(sample[col].to_numpy()[is_str], dtype=object)
+            values = values.str.strip().str.casefold()
+            col_times = pd.Series(times.array[is_str])
+            non_blank = (values != "").to_numpy()
+            if not non_blank.any():
+                continue
+            stats = col_times[non_blank].groupby(values[non_blank].to_numpy()).agg(
+                ["size", "min", "max"]
+            )
+            for value, count, first_seen, last_seen in stats.itertuples():
+                first_seen = _isoformat(first_seen, sampled_at)
+                last_seen = _isoformat(last_seen, sampled_at)
+                entry = self.values[value].get((table, col))
+                if entry is None:
+                    self.values[value][(table, col)] = [count, first_seen, last_seen]
+                else:
+                    entry[0] += count
+                    entry[1] = min(entry[1], first_seen)
+                    entry[2] = max(entry[2], last_seen)
+
+    def lookup(self, value: str) -> pd.DataFrame:
+        """
+        Return the table columns a value was seen in.
+
+        Returns
+        -------
+        pd.DataFrame
+            Columns table, column, count, first_seen and last_seen.
+        """
+        records = [
+            (table, col, *entry)
+            for (table, col), entry in self.values.get(self.normalize(value), {}).items()
+        ]
+        return pd.DataFrame.from_records(
+            records, columns=["table", "column", "count", "first_seen", "last_seen"]
+        )
+
+    def rules_out(self, table: str, column: str, value: str) -> bool:
+        """Return True if the table was recently sampled completely and the value was not seen in the column."""
+        entry = self.tables.get(table, {})
+        if not entry.get("complete"):
+            return False
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(entry["sampled_at"])
+        if age.total_seconds() > self.max_age:
+            return False
+        return (table, column) not in self.values.get(self.normalize(value), {})
+
+    def save(self, path: str):
+        """Save the index to a JSON file."""
+        save_to_json_file(
+            {
+                "version": self.VERSION,
+                "tables": self.tables,
+                "values": {
+                    value: [[table, col, *entry] for (table, col), entry in cols.items()]
+                    for value, cols in self.values.items()
+                },
+            },
+            path,
+        )
+
+    @classmethod
+    def load(cls, path: str, max_age: float = 3600) -> "EntityValueIndex":
+        """
+        Load an index saved with save, or return an empty index if the file doesn't exist.
+
+        Parameters
+        ----------
+        path : str
+            File path.
+        max_age : float, optional
+            Age in seconds after which a complete sample no longer rules
+            tables out, by default 3600
+
+        Raises
+        ------
+        ValueError
+            If the file was saved with an unsupported version.
+        """
+        index = cls(max_age)
+        data = read_json_file(path)
+        if not data:
+            return index
+        if data.get("version") != cls.VERSION:
+            raise ValueError(
+                f"Unsupported value index version {data.get('version')!r} in {path}"
+            )
+        index.tables = data["tables"]
+        for value, entries in data["values"].items():
+            index.values[value] = {
+                (table, col): [count, first_seen, last_seen]
+                for table, col, count, first_seen, last_seen in entries
+            }
+        return index
+
+
+class BloomFilter:
+    """
+    Bloom filter of normalized values.
+
+    Membership tests have no false negatives, and false positives at about
+    fp_rate while no more than capacity values were added.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        """
+        Instantiate an empty filter.
+
+        Parameters
+        ----------
+        capacity : int
+            Expected number of distinct values.
+        fp_rate : float, optional
+            False positive rate at capacity, by default 0.01
+        """
+        self.capacity = max(1, int(capacity))
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.count = 0
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, value: str):
+        """Return the bit positions of a value (double hashing of a single digest)."""
+        digest = hashlib.blake2b(value.encode("utf-8", "replace"), digest_size=16).digest()
+        hash1 = int.from_bytes(digest[:8], "little")
+        hash2 = int.from_bytes(digest[8:], "little") | 1
+        return ((hash1 + idx * hash2) % self.num_bits for idx in range(self.num_hashes))
+
+    def add(self, value: str):
+        """Add a normalized value."""
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        """Return False if the normalized value was definitely not added."""
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    def to_dict(self) -> Dict:
+        """Return a JSON serializable representation."""
+        return {
+            "capacity": self.capacity,
+            "fp_rate": self.fp_rate,
+            "count": self.count,
+            "bits": base64.b64encode(bytes(self.bits)).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BloomFilter":
+        """Rebuild a filter from to_dict output."""
+        bloom = cls(data["capacity"], data["fp_rate"])
+        bloom.count = data["count"]
+        bloom.bits = bytearray(base64.b64decode(data["bits"]))
+        return bloom
+
+
+class ColumnFilters:
+    """
+    Bloom filters of the distinct values of table columns.
+
+    The filters are built from "summarize by" extracts of each column and
+    refreshed incrementally with the values ingested since the last refresh.
+    A value missing from the filter of a column is definitely not in the
+    column (as of the last refresh) within the time window the filter
+    covers, so pivot queries starting inside that window can skip the column.
+    """
+
+    # Version of the persisted filters format
+    VERSION = 2
+
+    def __init__(self, fp_rate: float = 0.01, lookback: Optional[str] = None):
+        """
+        Instantiate an empty set of filters.
+
+        Parameters
+        ----------
+        fp_rate : float, optional
+            False positive rate of new filters, by default 0.01
+        lookback : str, optional
+            KQL timespan of the data covered by new filters, e.g. "30d". The filters
+            only rule columns out for pivots starting within it. By default None (all data)
+        """
+        self.fp_rate = fp_rate
+        self.lookback = lookback
+        # Dict structure is {(table, column): {"filter": BloomFilter, "refreshed_at": str,
+        # "covers_from": str or None (all data)}}
+        self.filters: Dict[Tuple[str, str], Dict] = {}
+
+    # Format of the refresh times, also valid in KQL datetime() literals
+    TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+    @staticmethod
+    def extract_query(
+        table: str, column: str, since: Optional[str] = None, lookback: Optional[str] = None
+    ) -> str:
+        """Return the query extracting the distinct values of a column."""
+        query = [table]
+        if since:
+            query.append(f"| where ingestion_time() > datetime({since})")
+        elif lookback:
+            query.append(f"| where TimeGenerated > ago({lookback})")
+        query.append(f"| where isnotempty({column})")
+        query.append(f"| summarize by {column} = tostring({column})")
+        return "\n".join(query)
+
+    def refresh(self, qry_prov, columns: List[Tuple[str, str]], max_age: float = 86400):
+        """
+        Build the missing filters and refresh the filters older than max_age.
+
+        Filters are refreshed by adding the values ingested since their last
+        refresh. A filter is rebuilt with twice the capacity once it holds
+        more values than its capacity.
+
+        Parameters
+        ----------
+        qry_prov : msticpy.data.data_providers.QueryProvider
+            Query provider used to run the extract queries.
+        columns : List[Tuple[str, str]]
+            (table, column) pairs to filter.
+        max_age : float, optional
+            Age in seconds after which a filter is refreshed, by default 86400 (one day)
+        """
+        now = datetime.now(timezone.utc)
+        for table, col in columns:
+            entry = self.filters.get((table, col))
+            if entry is not None:
+                refreshed_at = datetime.strptime(
+                    entry["refreshed_at"], self.TIME_FORMAT
+                ).replace(tzinfo=timezone.utc)
+                if (now - refreshed_at).total_seconds() < max_age:
+                    continue
+            since = entry["refreshed_at"] if entry is not None else None
+            values = self._extract_values(qry_prov, table, col, since)
+            if values is None:
+                continue
+            bloom = entry["filter"] if entry is not None else None
+            covers_from = entry["covers_from"] if entry is not None else self._window_start(now)
+            if bloom is not None and bloom.count + len(values) > bloom.capacity:
+                # Over capacity, rebuild from all of the values
+                values = self._extract_values(qry_prov, table, col)
+                if values is None:
+                    continue
+                bloom = None
+                covers_from = self._window_start(now)
+            if bloom is None:
+                # Leave room for incremental refreshes
+                bloom = BloomFilter(2 * max(len(values), 1), self.fp_rate)
+            for value in values:
+                bloom.add(value)
+            self.filters[(table, col)] = {
+                "filter": bloom,
+                "refreshed_at": now.strftime(self.TIME_FORMAT),
+                "covers_from": covers_from,
+            }
+
+    def _window_start(self, now: datetime) -> Optional[str]:
+        """Return the start of the data covered by a filter extracted now, None for all data."""
+        if self.lookback is None:
+            return None
+        return (now - pd.Timedelta(self.lookback)).strftime(self.TIME_FORMAT)
+
+    def _extract_values(self, qry_prov, table, col, since=None):
+        """Return the normalized distinct values of a column, or None if the query failed."""
+        data = qry_prov.exec_query(self.extract_query(table, col, since, self.lookback))
+        if not isinstance(data, pd.DataFrame) or col not in data:
+            print(f"warning: could not extract values of {table}.{col}")
+            return None
+        return {EntityValueIndex.normalize(value) for value in data[col].astype(str)}
+
+    def rules_out(self, table: str, column: str, value: str, start=None) -> bool:
+        """
+        Return True if the filter of the column shows that the value is definitely absent.
+
+        Parameters
+        ----------
+        table : str
+            Table name.
+        column : str
+            Column name.
+        value : str
+            Value searched for.
+        start : datetime or str, optional
+            Start of the time window of the pivot, by default None (unbounded).
+            Filters covering only recent data (see lookback) never rule out
+            a window starting before the data they cover.
+        """
+        entry = self.filters.get((table, column))
+        if entry is None:
+            return False
+        if entry["covers_from"] is not None:
+            covers_from = pd.Timestamp(entry["covers_from"])
+            if start is None or _utc_timestamp(start) < covers_from:
+                return False
+        return EntityValueIndex.normalize(value) not in entry["filter"]
+
+    def save(self, path: str):
+        """Save the filters to a JSON file."""
+        save_to_json_file(
+            {
+                "version": self.VERSION,
+                "fp_rate": self.fp_rate,
+                "lookback": self.lookback,
+                "filters": [
+                    [
+                        table,
+                        col,
+                        entry["refreshed_at"],
+                        entry["covers_from"],
+                        entry["filter"].to_dict(),
+                    ]
+                    for (table, col), entry in self.filters.items()
+                ],
+            },
+            path,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnFilters":
+        """
+        Load filters saved with save, or return empty filters if the file doesn't exist.
+
+        Raises
+        ------
+        ValueError
+            If the file was saved with an unsupported version.
+        """
+        data = read_json_file(path)
+        if not data:
+            return cls()
+        if data.get("version") not in (1, cls.VERSION):
+            raise ValueError(
+                f"Unsupported column filters version {data.get('version')!r} in {path}"
+            )
+        filters = cls(data["fp_rate"], data["lookback"])
+        for entry in data["filters"]:
+            if data["version"] == 1:
+                # The build time is unknown, the last refresh gives a later,
+                # so conservative, start of the covered data
+                table, col, refreshed_at, bloom = entry
+                covers_from = filters._window_start(
+                    datetime.strptime(refreshed_at, cls.TIME_FORMAT)
+                )
+            else:
+                table, col, refreshed_at, covers_from, bloom = entry
+            filters.filters[(table, col)] = {
+                "filter": BloomFilter.from_dict(bloom),
+                "refreshed_at": refreshed_at,
+                "covers_from": covers_from,
+            }
+        return filters
+
+
+def _utc_timestamp(value) -> pd.Timestamp:
+    """Return a datetime, timestamp or date string as a UTC timestamp, naive values are taken as UTC."""
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def _isoformat(timestamp, default: str) -> str:
+    """Return a timestamp as ISO 8601 string, or the default if it is missing."""
+    return default if pd.isna(timestamp) else pd.Timestamp(timestamp).isoformat()
+
+
+def graph_hash(graph: nx.Graph) -> str:
+    """Return a hash of the nodes and edges of a graph."""
+    edges = sorted(sorted((str(src), str(dst))) for src, dst in graph.edges())
+    data = json.dumps([sorted(str(node) for node in graph.nodes()), edges])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class LayoutCache:
+    """Node coordinates of graph layouts keyed by graph hash, optionally persisted to a JSON file."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Instantiate the cache.
+
+        Parameters
+        ----------
+        path : str, optional
+            JSON file to read the layouts from and save new layouts to,
+            by default None (in memory only)
+        """
+        self.path = path
+        self.layouts: Dict[str, Dict[str, List[float]]] = (read_json_file(path) or {}) if path else {}
+
+    def layout(self, graph: nx.Graph) -> Dict[str, List[float]]:
+        """Return the spring layout of a graph, computing it only for new graphs."""
+        key = graph_hash(graph)
+        if key not in self.layouts:
+            positions = nx.spring_layout(graph, seed=0) if len(graph) else {}
+            # Rounded coordinates keep the cache and JSON output compact
+            self.layouts[key] = {
+                str(node): [round(float(x), 4), round(float(y), 4)]
+                for node, (x, y) in positions.items()
+            }
+            if self.path:
+                save_to_json_file(self.layouts, self.path)
+        return self.layouts[key]
+
+
+class EntityIdentifier:
+    """Class for identifying entities in the tables of an Azure Sentinel workspace."""    
+
+    def __init__(self, qry_prov, regex_engine="re", max_value_length=None):
+        """
+        Instantiate the EntityIdentifier class.
+
+        Parameters
+        ----------
+        qry_prov : msticpy.data.data_providers.QueryProvider
+            An authenticated query provider that has been connected to an Azure Sentinel workspace.
+            Wrap it in src.query_cache.CachedQueryProvider to share a disk cache of query results.
+        regex_engine : Union[str, Callable], optional
+            Regex engine used for entity detection, "re", the linear-time "re2"
+            (requires google-re2), "arrow" to match whole columns with Arrow compute
+            kernels (requires pyarrow), or a custom compile function, by default "re"
+        max_value_length : int, optional
+            Values longer than this are not matched (but still counted as
+            non-blank), which bounds the time spent on huge values, by default None
+        """        
+
+        # match results store, one row per (table, column, regex), see matches_to_frame
+        self.matches: pd.DataFrame
+        # winning match of each column indexed by entity, see interpret_match_frame
+        self._entity_columns: pd.DataFrame
+        # boolean mask of the winning matches in self.matches
+        self._assigned: pd.Series
+        # table_map and entity_map views, built on first access
+        self._views: Dict[str, Dict] = {}
+        # inverted index of sampled values, built by detect_entities(index_values=True)
+        self.value_index: Optional[EntityValueIndex] = None
+        # Bloom filters of column values, built by refresh_column_filters
+        self.column_filters: Optional[ColumnFilters] = None
+        # tables detect_entities_adaptive could not sample within its budgets
+        self.unsampled_tables: List[str] = []
+        # query, status, latency and rows of each query of the last run_queries call
+        self.query_stats: List[Dict] = []
+        # graph layouts, set a LayoutCache with a path to keep them between sessions
+        self.layout_cache = LayoutCache()
+        self.qry_prov = qry_prov
+        # load the regexes
+        self.regexes = read_json_file("regexes.json")
+        self._regex_matches = {}
+        self.regex_engine = regex_engine
+        self.max_value_length = max_value_length
+        # compiled regexes, built once and shared by every table and column
+        self._compiled_regexes = compile_regexes(self.regexes, engine=regex_engine)
+        # combined scanner for partial matches and entity extraction
+        self._scanner, self._scanner_groups = compile_scanner(self.regexes)
+        # structural prefilters used to skip regexes that cannot match a column
+        self._prefilters = compile_prefilters(self.regexes)
+        # column name hints and [columns matched, columns evaluated] of each regex,
+        # used to order the regexes when short-circuiting
+        self._column_hints = compile_column_hints(self.regexes)
+        self._regex_stats: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+        # priority 0 regexes decide a column on their own when they match every value
+        self._decisive_regexes = {
+            name
+            for name, regex_def in self.regexes.items()
+            if int(regex_def.get("priority", 0)) == 0 and regex_def.get("entity")
+        }
+        # selected tables
+        self.selected_tables = nbwidgets.SelectSubset(source_items=list(self.qry_prov.schema.keys()), auto_display=False)
+
+
+    @property
+    def _regex_matches(self) -> Dict[str, Dict[str, Dict[str, Tuple[float, float]]]]:
+        """Dict structure is {table: {column: {regex: (non-blank-matches, all-matches)}}}."""
+        return frame_to_matches(self.matches)
+
+
+    @_regex_matches.setter
+    def _regex_matches(self, regex_matches: Dict):
+        """Store the regex matches and interpret them."""
+        self._set_match_frame(matches_to_frame(regex_matches, self.regexes))
+
+
+    def _set_match_frame(self, frame, assigned=None):
+        """Store the match results store and its interpreted winners."""
+        self.matches = frame
+        winners = (
+            interpret_match_frame(frame) if assigned is None else frame[assigned.to_numpy()]
+        )
+        self._assigned = pd.Series(frame.index.isin(winners.index), index=frame.index)
+        self._entity_columns = winners.set_index("entity", drop=False)
+        self._views = {}
+
+
+    @property
+    def table_map(self) -> Dict[str, Dict[str, str]]:
+        """Interpreted results, dict structure is {table: {column: entity}}."""
+        if "table_map" not in self._views:
+            self._views["table_map"] = self._table_map_view(
+                self._entity_columns, self.matches["table"].cat.categories
+            )
+        return self._views["table_map"]
+
+
+    @property
+    def entity_map(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Reverse mapping from entities to table/column, dict structure is {entity: [(table, col)]}."""
+        if "entity_map" not in self._views:
+            entity_map = {}
+            for table, cols in self.table_map.items():
+                for col, entity in cols.items():
+                    entity_map.setdefault(entity, []).append((table, col))
+            self._views["entity_map"] = entity_map
+        return self._views["entity_map"]
+
+
+    def entity_columns(self, entity: str) -> pd.DataFrame:
+        """
+        Return the columns assigned to an entity.
+
+        Parameters
+        ----------
+        entity : str
+            Entity name, e.g. "ipaddress".
+
+        Returns
+        -------
+        pd.DataFrame
+            Winning matches (MATCH_COLUMNS) of the columns assigned to the entity.
+        """
+        if entity not in self._entity_columns.index:
+            return self._entity_columns.iloc[0:0]
+        return self._entity_columns.loc[[entity]]
+
+
+    @staticmethod
+    def _table_map_view(winners, tables):
+        """Return {table: {column: entity}} of interpret_match_frame output."""
+        table_map = {table: {} for table in tables}
+        for table, col, entity in zip(winners["table"], winners["column"], winners["entity"]):
+            table_map[table][col] = entity if isinstance(entity, str) else None
+        return table_map
+
+
+    def save_results(self, path: str = "./results.json"):
+        """
+        Save _regex_matches, table_map, and entity_map to a JSON file.
+
+        Paths ending in .arrow, .feather or .ipc (Arrow IPC) or .parquet are saved
+        in a versioned binary format instead (requires pyarrow), see write_results_file.
+
+        Parameters
+        ----------
+        path : str, optional
+            File path of the file to be created, by default "./results.json"
+        """
+        if not self._regex_matches:
+            return
+        if Path(path).suffix.lower() in RESULTS_FORMATS:
+            write_results_file(self.matches, self._assigned, path)
+            return
+        results = {
+            "regex_matches": self._regex_matches,
+            "table_map": self.table_map,
+            "entity_map": self.entity_map
+        }
+        save_to_json_file(results, path)
+
+
+    def save_value_index(self, path: str = "./value_index.json"):
+        """
+        Save the inverted index of sampled values to a JSON file.
+
+        Parameters
+        ----------
+        path : str, optional
+            File path of the file to be created, by default "./value_index.json"
+        """
+        if self.value_index is not None:
+            self.value_index.save(path)
+
+
+    def read_value_index(self, path: str = "./value_index.json", max_age: float = 3600):
+        """
+        Read an inverted index of sampled values saved with save_value_index.
+
+        Later detect_entities(index_values=True) calls add to the loaded index.
+
+        Parameters
+        ----------
+        path : str, optional
+            File path, by default "./value_index.json"
+        max_age : float, optional
+            Age in seconds after which completely sampled tables are no
+            longer ruled out, by default 3600
+        """
+        self.value_index = EntityValueIndex.load(path, max_age)
+
+
+    def lookup_value(self, search_value: str, entity_type: Optional[str] = None) -> pd.DataFrame:
+        """
+        Return the sampled table columns a value was seen in, without querying the workspace.
+
+        Parameters
+        ----------
+        search_value : str
+            Value to look up, case-insensitive.
+        entity_type : str, optional
+            Only return columns mapped to this entity, by default all columns
+
+        Returns
+        -------
+        pd.DataFrame
+            Columns table, column, count, first_seen and last_seen.
+        """
+        if self.value_index is None:
+            return EntityValueIndex().lookup(search_value)
+        hits = self.value_index.lookup(search_value)
+        if entity_type is not None:
+            is_entity = [
+                self.table_map.get(table, {}).get(col) == entity_type
+                for table, col in zip(hits["table"], hits["column"])
+            ]
+            hits = hits[is_entity]
+        return hits
+
+
+    def _index_samples(self, samples, sample_size):
+        """Add each sample to the value index while passing it on."""
+        if self.value_index is None:
+            self.value_index = EntityValueIndex()
+        for table, df in samples:
+            self.value_index.add_sample(
+                table, df, list(self._string_columns(df)), int(sample_size)
+            )
+            yield table, df
 
-    def __init__(self, qry_prov):
+
+    def refresh_column_filters(
+        self, entity_types=None, max_age=86400, fp_rate=0.01, lookback=None
+    ):
         """
-        Instantiate the EntityIdentifier class.
+        Build or refresh the Bloom filters of the columns mapped to entities.
 
         Parameters
         ----------
-        qry_prov : msticpy.data.data_providers.QueryProvider
-            An authenticated query provider that has been connected to an Azure Sentinel workspace.
-        """        
+        entity_types : List[str], optional
+            Entities whose columns are filtered, by default all entities
+        max_age : float, optional
+            Age in seconds after which a filter is refreshed, by default 86400 (one day)
+        fp_rate : float, optional
+            False positive rate of new filters, by default 0.01
+        lookback : str, optional
+            KQL timespan covered by new filters, they only rule out pivots starting
+            within it, by default None (all data)
+        """
+        if self.column_filters is None:
+            self.column_filters = ColumnFilters(fp_rate, lookback)
+        columns = [
+            (table, col)
+            for entity, pairs in self.entity_map.items()
+            if entity_types is None or entity in entity_types
+            for table, col in pairs
+        ]
+        self.column_filters.refresh(self.qry_prov, columns, max_age)
 
-        # Dict structure is {table: {column: {regex: (non-blank-matches, all-matches)}}}
-        self._regex_matches: Dict[str, Dict[str, Dict[str, Tuple(float, float)]]]
-        # object attribute to interpreted results
-        self.table_map: Dict[str, Dict[str, str]]
-        # reverse mapping from entities to table/column
-        self.entity_map: Dict[str, List[Tuple(str, str)]]
-        self.qry_prov = qry_prov
-        # load the regexes
-        self.regexes = read_json_file("regexes.json")
-        # selected tables
-        self.selected_tables = nbwidgets.SelectSubset(source_items=list(self.qry_prov.schema.keys()), auto_display=False)
 
+    def save_column_filters(self, path: str = "./column_filters.json"):
+        """
+        Save the column Bloom filters to a JSON file.
 
-    def save_results(self, path: str = "./results.json"):
+        Parameters
+        ----------
+        path : str, optional
+            File path of the file to be created, by default "./column_filters.json"
         """
-        Save _regex_matches, table_map, and entity_map to a JSON file.
+        if self.column_filters is not None:
+            self.column_filters.save(path)
+
+
+    def read_column_filters(self, path: str = "./column_filters.json"):
+        """
+        Read column Bloom filters saved with save_column_filters.
 
         Parameters
         ----------
         path : str, optional
-            File path of the file to be created, by default "./results.json"
+            File path, by default "./column_filters.json"
         """
-        if not self._regex_matches:
-            return
-        results = {
-            "regex_matches": self._regex_matches,
-            "table_map": self.table_map,
-            "entity_map": self.entity_map
-        }
-        save_to_json_file(results, path)
+        self.column_filters = ColumnFilters.load(path)
+
+
+    def _ruled_out(self, table, col, search_value, use_index, start=None):
+        """Return True if the value index or the column filters show that the value is not in the column."""
+        if not use_index:
+            return False
+        return (
+            self.value_index is not None
+            and self.value_index.rules_out(table, col, search_value)
+        ) or (
+            self.column_filters is not None
+            and self.column_filters.rules_out(table, col, search_value, start)
+        )
 
 
-    def read_results(self, path: str = "./results.json"):
+    def read_results(self, path: str = "./results.json", tables=None):
         """
         Read results dict and store the values in designated class variables.
 
+        table_map and entity_map are rebuilt from the stored regex matches.
+        Binary results files (see save_results) are memory-mapped and only the
+        given tables are loaded.
+
         Parameters
         ----------
         path : str, optional
             File path, by default "./results.json"
+        tables : List[str], optional
+            Tables to load from a binary results file, by default all tables
         """    
+        if Path(path).suffix.lower() in RESULTS_FORMATS:
+            self._set_match_frame(*read_results_file(path, tables))
+            return
         results = read_json_file(path)
         if results:
             self._regex_matches = results["regex_matches"]
-            self.table_map = results["table_map"]
-            self.entity_map = results["entity_map"]
 
 
-    def search_single_table(self, table, partial=False, debug=False):
+    def search_single_table(
+        self, table, partial=False, debug=False, distinct=False, short_circuit=False, regex_stats=None
+    ):
         """
         Apply every regex to every column in the given table.
 
@@ -260,8 +2235,23 @@ class EntityIdentifier:
             A table/log queried from the connected Azure Sentinel workspace.
         partial : bool, optional
             If True, searches for substring matches. If False, searches for a match for the entire string, by default False
+            Partial matches scan each value once with the combined scanner
+            and count the values containing at least one match of each regex.
         debug : bool, optional
             If True, prints the columns for which no match was found, by default False
+        distinct : bool, optional
+            If True, applies each regex once per distinct value and weights the matches
+            by the value counts, by default False. The match ratios are identical to
+            the row-by-row search but much cheaper for low-cardinality columns.
+        short_circuit : bool, optional
+            If True, evaluates the regexes most likely to match each column first
+            and stops as soon as a priority 0 regex matches every non-blank value,
+            since interpret_matches assigns that entity whatever else matches.
+            The remaining regexes are missing from the results, so keep the default
+            full detail for the HTML match tables, by default False
+        regex_stats : Dict[str, List[int]], optional
+            Hit rates used and updated when short-circuiting, by default None
+            (the hit rates learned by this instance)
 
         Returns
         -------
@@ -271,49 +2261,390 @@ class EntityIdentifier:
         
         # Dictionary to store results
         full_matches = {}
-        # Iterate over each column
-        for col in table.columns:
-            if len(table[col]) < 1:
+        # Iterate over each string column
+        for col in self._string_columns(table, debug):
+            if short_circuit and not partial:
+                col_matches = self._match_column_short_circuit(
+                    col, table[col], distinct, regex_stats
+                )
+            elif partial:
+                col_matches = self._match_ratios(
+                    len(table[col]),
+                    *self._scan_value_counts(
+                        self._column_value_counts(table[col], distinct)
+                    ),
+                )
+            else:
+                col_matches = self._match_column(
+                    table[col],
+                    self._compiled_regexes,
+                    distinct,
+                    self._prefilters,
+                    self.max_value_length,
+                )
+            if col_matches:
+                full_matches[col] = col_matches
+            elif debug:
+                print(f" -- col {col} no match found")
+        return full_matches
+
+
+    def _match_column_short_circuit(self, col, column, distinct=False, regex_stats=None):
+        """
+        Apply the regexes to a column in evaluation order until its entity is decided.
+
+        Parameters
+        ----------
+        col : str
+            Column name, used to look up column hints.
+        column : Series
+            Column of a table queried from the Azure Sentinel workspace.
+        distinct : bool, optional
+            If True, matches each distinct value once weighted by its count, by default False
+        regex_stats : Dict[str, List[int]], optional
+            [columns matched, columns evaluated] of each regex, used to order the
+            regexes and updated with this column, by default None (self._regex_stats)
+
+        Returns
+        -------
+        Dict[str, Tuple(float, float)]
+            {regex: (non-blank-matches, all-matches)} for the evaluated regexes matching at
+            least one row. A deciding regex is listed first.
+        """
+        if regex_stats is None:
+            regex_stats = self._regex_stats
+        order = evaluation_order(
+            col, list(self._compiled_regexes), self._column_hints, regex_stats
+        )
+        num_blanks, match_counts = self._count_matches(
+            self._column_value_counts(column, distinct),
+            self._compiled_regexes,
+            self._prefilters,
+            self.max_value_length,
+            order=order,
+            decisive=self._decisive_regexes,
+            num_rows=len(column),
+        )
+        decided = next(iter(match_counts), None)
+        if match_counts.get(decided) != len(column) - num_blanks:
+            decided = None
+        # Learn the hit rates of the evaluated regexes for the next columns
+        for name in order:
+            regex_stats[name][1] += 1
+            if name in match_counts:
+                regex_stats[name][0] += 1
+            if name == decided and name in self._decisive_regexes:
+                break
+        return self._match_ratios(len(column), num_blanks, match_counts)
+
+
+    def _scan_value_counts(self, value_counts):
+        """
+        Count the blank values and the values containing a match of each regex.
+
+        Parameters
+        ----------
+        value_counts : List[Tuple[str, int]]
+            Output of _column_value_counts function.
+
+        Returns
+        -------
+        Tuple[int, Dict[str, int]]
+            Number of blank values and {regex: number of values with a match}.
+        """
+        num_blanks = 0
+        match_counts = Counter()
+        for value, count in value_counts:
+            if not value.strip():
+                num_blanks += count
+                continue
+            if self.max_value_length is not None and len(value) > self.max_value_length:
                 continue
-            # Skip non-string columns
-            if not isinstance(table[col][0], str):
+            found = {
+                self._scanner_groups[match.lastgroup]
+                for match in self._scanner.finditer(value)
+                if match.end() > match.start()
+            }
+            for name in found:
+                match_counts[name] += count
+        return num_blanks, dict(match_counts)
+
+
+    def extract_entities(self, table, columns=None, return_values=False):
+        """
+        Extract entities from free-text columns with the combined scanner.
+
+        Every value is scanned once for all of the regexes (with the ^ and $
+        delimiters removed), e.g. to find the IP addresses, files and accounts
+        in CommandLine, Message or AdditionalExtensions columns.
+
+        Parameters
+        ----------
+        table : DataFrame
+            A table/log queried from the connected Azure Sentinel workspace.
+        columns : List[str], optional
+            Columns to scan, by default all string columns
+        return_values : bool, optional
+            If True, also returns the extracted values, by default False
+
+        Returns
+        -------
+        Dict
+            "counts": {column: {entity: number of extractions}},
+            "values": {column: {entity: [extracted values]}} (if return_values),
+            "mb_per_sec": scanning throughput in MB/s.
+            Regexes without an entity are reported by regex name.
+        """
+        if columns is None:
+            columns = list(self._string_columns(table))
+        counts = {}
+        values = {}
+        num_bytes = 0
+        seconds = 0.0
+        for col in columns:
+            col_values = [
+                value
+                for value in table[col]
+                if isinstance(value, str)
+                and (self.max_value_length is None or len(value) <= self.max_value_length)
+            ]
+            num_bytes += sum(len(value.encode("utf-8", "replace")) for value in col_values)
+            col_counts = Counter()
+            col_extracted = defaultdict(list)
+            start = time.perf_counter()
+            for value in col_values:
+                for match in self._scanner.finditer(value):
+                    if match.end() == match.start():
+                        continue
+                    name = self._scanner_groups[match.lastgroup]
+                    entity = self.regexes[name].get("entity", name)
+                    col_counts[entity] += 1
+                    if return_values:
+                        col_extracted[entity].append(match.group())
+            seconds += time.perf_counter() - start
+            if col_counts:
+                counts[col] = dict(col_counts)
+                if return_values:
+                    values[col] = dict(col_extracted)
+        results = {
+            "counts": counts,
+            "mb_per_sec": num_bytes / 1e6 / seconds if seconds else 0.0,
+        }
+        if return_values:
+            results["values"] = values
+        return results
+
+
+    @staticmethod
+    def _string_columns(table, debug=False):
+        """Yield the names of the columns of the table that contain string values."""
+        for col in table.columns:
+            column = table[col]
+            # Skip non-string columns and columns without any string values
+            if not (
+                pd.api.types.is_object_dtype(column.dtype)
+                or pd.api.types.is_string_dtype(column.dtype)
+            ) or not any(isinstance(value, str) for value in column):
                 if debug:
-                    print(f" -- col {col} is type {table[col].dtype}. Skipping")
+                    print(f" -- col {col} is type {column.dtype}. Skipping")
                 continue
-            # Iterate over every regex
-            for name, regex in self.regexes.items():
-                # Strip off ^ and $ delimiters
-                if partial:
-                    regex = re.sub(r"^\s*\^(.*)\s*\$\s*$", r"\1", regex["regex"])
-                # Try the regex on the column
-                match_series = table[col].str.match(
-                    regex["regex"], case=False, flags=re.VERBOSE
-                )
-                # If there are more than zero rows in the table
-                if len(match_series) > 0:
-                    # Calculate the match ratios, including blanks (total_match_ratio)
-                    # and not including blanks (match_ratio)
-                    total_match_ratio = match_series.sum() / len(match_series)
-                    blanks_df = table[col].str.strip() == ""
-                    num_non_blanks = len(match_series) - blanks_df.sum()
-                    match_ratio = (
-                        match_series.sum() / num_non_blanks
-                        if num_non_blanks > 0
-                        else total_match_ratio
+            yield col
+
+
+    @staticmethod
+    def _match_column(
+        column, compiled_regexes, distinct=False, prefilters=None, max_length=None
+    ):
+        """
+        Apply every compiled regex to a single column.
+
+        Parameters
+        ----------
+        column : Series
+            Column of a table queried from the Azure Sentinel workspace.
+        compiled_regexes : Dict[str, Pattern]
+            Output of compile_regexes function.
+        distinct : bool, optional
+            If True, matches each distinct value once weighted by its count, by default False
+        prefilters : Dict[str, Dict], optional
+            Output of compile_prefilters function, by default None
+        max_length : int, optional
+            Values longer than this are not matched, by default None
+
+        Returns
+        -------
+        Dict[str, Tuple(float, float)]
+            {regex: (non-blank-matches, all-matches)} for regexes matching at least one row.
+        """
+        match_counts = EntityIdentifier._count_column(
+            column, compiled_regexes, distinct, prefilters, max_length
+        )
+        return EntityIdentifier._match_ratios(len(column), *match_counts)
+
+
+    @staticmethod
+    def _count_column(
+        column, compiled_regexes, distinct=False, prefilters=None, max_length=None
+    ):
+        """
+        Count the blank values and the values of a column matching each regex.
+
+        With the arrow engine the column is converted to an Arrow string
+        array and the counts are computed with Arrow compute kernels.
+        Otherwise this is _count_matches of _column_value_counts.
+
+        Returns
+        -------
+        Tuple[int, Dict[str, int]]
+            Number of blank values and {regex: number of matches} for regexes matching at least one value.
+        """
+        if any(isinstance(pattern, ArrowRegex) for pattern in compiled_regexes.values()):
+            _, compute = _import_pyarrow()
+            values, counts = _to_arrow_strings(column), None
+            if distinct:
+                value_counts = compute.value_counts(values)
+                values = value_counts.field("values")
+                counts = value_counts.field("counts")
+            return _count_arrow_matches(values, counts, compiled_regexes, max_length)
+        value_counts = EntityIdentifier._column_value_counts(column, distinct)
+        return EntityIdentifier._count_matches(
+            value_counts, compiled_regexes, prefilters, max_length
+        )
+
+
+    @staticmethod
+    def _column_value_counts(column, distinct=False):
+        """
+        Return the string values of a column as (value, count) pairs.
+
+        Non-string values are dropped since they can never match
+        (str.match returns NaN for them). If distinct is False every row
+        is returned with a count of 1.
+        """
+        str_values = (value for value in column if isinstance(value, str))
+        if distinct:
+            return list(Counter(str_values).items())
+        return [(value, 1) for value in str_values]
+
+
+    @staticmethod
+    def _count_matches(
+        value_counts,
+        compiled_regexes,
+        prefilters=None,
+        max_length=None,
+        order=None,
+        decisive=None,
+        num_rows=None,
+    ):
+        """
+        Count the blank values and the values matching each regex.
+
+        The blank count and column fingerprint are computed once for the
+        column and shared by all of the regexes. Regexes whose prefilter
+        rules out every value in the column are skipped.
+
+        If decisive regexes are given, evaluation stops at the first of them
+        matching all num_rows - blanks values. The arrow engine always
+        evaluates every regex.
+
+        Parameters
+        ----------
+        value_counts : List[Tuple[str, int]]
+            Output of _column_value_counts function.
+        compiled_regexes : Dict[str, Pattern]
+            Output of compile_regexes function.
+        prefilters : Dict[str, Dict], optional
+            Output of compile_prefilters function, by default None
+        max_length : int, optional
+            Values longer than this are not matched, by default None
+        order : List[str], optional
+            Names of the regexes in evaluation order, by default the compiled_regexes order
+        decisive : Set[str], optional
+            Regexes that decide the column when they match every non-blank row, by default None
+        num_rows : int, optional
+            Number of rows in the column, required with decisive, by default None
+
+        Returns
+        -------
+        Tuple[int, Dict[str, int]]
+            Number of blank values and {regex: number of matches} for regexes matching at least one value.
+            A deciding regex is listed first.
+        """
+        if any(isinstance(pattern, ArrowRegex) for pattern in compiled_regexes.values()):
+            pyarrow, _ = _import_pyarrow()
+            return _count_arrow_matches(
+                pyarrow.array([value for value, _ in value_counts], type=pyarrow.string()),
+                pyarrow.array([count for _, count in value_counts], type=pyarrow.int64()),
+                compiled_regexes,
+                max_length,
+            )
+        num_blanks = sum(count for value, count in value_counts if not value.strip())
+        if max_length is not None:
+            # Don't let a single huge value stall the whole column
+            value_counts = [
+                (value, count) for value, count in value_counts if len(value) <= max_length
+            ]
+        fingerprint = None
+        match_counts = {}
+        num_non_blanks = num_rows - num_blanks if decisive else None
+        # Iterate over every regex
+        for name in order or compiled_regexes:
+            pattern = compiled_regexes[name]
+            prefilter = prefilters.get(name) if prefilters else None
+            if prefilter:
+                if fingerprint is None:
+                    fingerprint = _column_fingerprint(
+                        [value for value, _ in value_counts]
                     )
-                    # If at least one entry in the column matched the regex
-                    if total_match_ratio > 0:
-                        # Add the column, regex, and match ratios to the dict
-                        # If this column has already matched with a regex
-                        if col in full_matches:
-                            full_matches[col][name] = match_ratio, total_match_ratio
-                        else:
-                            full_matches[col] = {}
-                            full_matches[col][name] = match_ratio, total_match_ratio
-            if col not in full_matches and debug:
-                print(f" -- col {col} no match found")
-        return full_matches
-        
+                if not _prefilter_passes(prefilter, fingerprint):
+                    continue
+            match = pattern.match
+            num_matches = sum(count for value, count in value_counts if match(value))
+            if num_matches > 0:
+                match_counts[name] = num_matches
+                if decisive and name in decisive and num_matches == num_non_blanks:
+                    # Listed first, interpret_matches picks it over earlier 100% matches
+                    match_counts = {name: num_matches, **match_counts}
+                    break
+        return num_blanks, match_counts
+
+
+    @staticmethod
+    def _match_ratios(num_rows, num_blanks, match_counts):
+        """
+        Convert match counts for a column into match ratios.
+
+        Parameters
+        ----------
+        num_rows : int
+            Number of rows in the column.
+        num_blanks : int
+            Number of blank string values in the column.
+        match_counts : Dict[str, int]
+            Number of matches for each regex.
+
+        Returns
+        -------
+        Dict[str, Tuple(float, float)]
+            {regex: (non-blank-matches, all-matches)}
+        """
+        num_non_blanks = num_rows - num_blanks
+        col_matches = {}
+        for name, num_matches in match_counts.items():
+            # If at least one entry in the column matched the regex
+            if num_matches > 0:
+                # Calculate the match ratios, including blanks (total_match_ratio)
+                # and not including blanks (match_ratio)
+                total_match_ratio = num_matches / num_rows
+                match_ratio = (
+                    num_matches / num_non_blanks
+                    if num_non_blanks > 0
+                    else total_match_ratio
+                )
+                col_matches[name] = match_ratio, total_match_ratio
+        return col_matches
+
 
     def table_match_to_html(self, table_name, show_guids=False):
         """
@@ -332,7 +2663,7 @@ class EntityIdentifier:
             Displays columns and their respective regex matches along with the match percentages, corresponding entities, and their priorities.
         """
 
-        if table_name not in self._regex_matches:
+        if table_name not in self.matches["table"].cat.categories:
             return HTML("No data")
 
         # Create html table header
@@ -340,23 +2671,22 @@ class EntityIdentifier:
             "<table><thead><tr><th>Column</th><th>Matches</th></tr></thead><tbody>"
         ]
 
-        for col, matches in self._regex_matches[table_name].items():
-            col_html = {}
-            for rgx_match, perc_match in matches.items():
-                if rgx_match == "GUID_REGEX" and not show_guids:
-                    continue
-                # Get the entity name and priority for this match
-                entity_name = self.regexes.get(rgx_match, {}).get("entity")
-                regex_priority = self.regexes.get(rgx_match, {}).get("priority", 0)
-                if not entity_name:
-                    entity_name = rgx_match
-                # Add a row for the column (using a dictionary since we later want to sort
-                # based on priority)
-                col_html[regex_priority] = (
-                    f"<b>{entity_name}</b> [p:{regex_priority}] "
-                    f"(matched {rgx_match} {perc_match[0] * 100:0.1f}%,  "
-                    f"all rows {perc_match[1] * 100:0.1f}%) "
-                )
+        table_matches = self.matches[self.matches["table"] == table_name]
+        if not show_guids:
+            table_matches = table_matches[table_matches["regex"] != "GUID_REGEX"]
+        html_cols = {}
+        for match in table_matches.itertuples(index=False):
+            col_html = html_cols.setdefault(match.column, {})
+            # Use the regex name for regexes without an entity
+            entity_name = match.entity if isinstance(match.entity, str) else match.regex
+            # Add a row for the column (using a dictionary since we later want to sort
+            # based on priority)
+            col_html[match.priority] = (
+                f"<b>{entity_name}</b> [p:{match.priority}] "
+                f"(matched {match.regex} {match.ratio * 100:0.1f}%,  "
+                f"all rows {match.total_ratio * 100:0.1f}%) "
+            )
+        for col, col_html in html_cols.items():
             # sort the different matches by priority
             sorted_by_pri = [
                 value
@@ -372,108 +2702,609 @@ class EntityIdentifier:
         return HTML(f"{header} {''.join(table_html)}</tbody></table>")
 
 
-    def interpret_matches(self, regex_matches):
+    def interpret_matches(self, regex_matches):
+        """
+        For each column apply priority and match percentage logic to assign an entity to the column.
+
+        Parameters
+        ----------
+        regex_matches : Dict
+            Output of match_entities function. Dict showing all columns that matched one or more regexes. 
+            Dict structure is {table: {column: {regex: (non-blank-matches, all-matches)}}}
+
+        Returns
+        -------
+        Dict
+            Dict structure is {table: {column: entity}}.
+        """        
+        # Choose entity corresponding to the regex with the highest match percentage
+        # If tie, choose entity with highest priority (0 is the highest, 2 the lowest)
+        frame = matches_to_frame(regex_matches, self.regexes)
+        return self._table_map_view(
+            interpret_match_frame(frame), frame["table"].cat.categories
+        )
+
+    def create_entity_map(self, table_map):
+        """
+        Iterates through the interpreted results to create a dict keyed by entity type.
+
+        Parameters
+        ----------
+        table_map : Dict
+            Output of interpret_matches function. Dict of column-entity mappings keyed by table and column.
+            Dict structure is {table: {column: entity}}.
+
+        Returns
+        -------
+        Dict
+            Dict structure is Dict: {entity: [(table, col)]}.
+        """        
+        entity_dict = {}
+        for table, cols in table_map.items():
+            for col, entity in cols.items():
+                entity_dict[entity] = []
+        for table, cols in table_map.items():
+            for col, entity in cols.items():
+                entity_dict[entity].append((table, col))
+        return entity_dict
+
+
+    # Run methods
+
+    def _sample_tables(
+        self, tables, sample_size="100", max_workers=1, batch_size=1, columns=None
+    ):
+        """
+        Query a sample of each table, yielding the results as they arrive.
+
+        Parameters
+        ----------
+        tables : List[str]
+            Tables to sample.
+        sample_size : str, optional
+            Number of events/rows in each table to sample, by default "100"
+        max_workers : int, optional
+            Number of sample queries to run concurrently, by default 1
+        batch_size : int, optional
+            Number of tables sampled by a single union query, by default 1
+        columns : Dict[str, List[str]], optional
+            Columns to project for each table, by default None (all columns)
+
+        Yields
+        ------
+        Tuple[str, DataFrame]
+            Table name and sampled rows, in completion order.
+        """
+        batches = union_batches(tables, batch_size, sample_size)
+        with tqdm(total=len(tables)) as progress:
+            if max_workers <= 1:
+                for batch in batches:
+                    for table, df in sample_batch(self.qry_prov, batch, sample_size, columns):
+                        progress.update()
+                        yield table, df
+                return
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(sample_batch, self.qry_prov, batch, sample_size, columns)
+                    for batch in batches
+                ]
+                try:
+                    for future in as_completed(futures):
+                        for table, df in future.result():
+                            progress.update()
+                            yield table, df
+                finally:
+                    # Don't start any queued queries if the caller stops early
+                    for future in futures:
+                        future.cancel()
+
+
+    def detect_entities(
+        self,
+        tables=None,
+        sample_size="100",
+        distinct=False,
+        max_workers=1,
+        match_processes=1,
+        batch_size=1,
+        cache_path=None,
+        cache_ttl=86400,
+        project=True,
+        short_circuit=False,
+        index_values=False,
+    ):
+        """
+        Runs the search_single_table, interpret_matches, and create_entity_map functions on given tables.
+        Persists/saves returned values in instance result attributes.
+
+        Parameters
+        ----------
+        tables : List[str]
+            Array of tables in string format to iterate over. 
+            If no tables are explictly passed in as a parameter, the tables selected in select_tables() function are used.
+        sample_size : str, optional
+            Number of events/rows in each table to sample, by default "100"
+        distinct : bool, optional
+            If True, matches regexes against distinct column values weighted by their
+            counts, which allows much larger sample sizes, by default False
+        max_workers : int, optional
+            Number of sample queries to run concurrently. Regex matching starts as soon
+            as each sample arrives, by default 1
+        match_processes : int, optional
+            Number of worker processes used to evaluate the regexes. If greater than 1,
+            each (table, column) is matched in a process pool, by default 1
+        batch_size : int, optional
+            Number of tables sampled by each query. If greater than 1, tables are
+            sampled in batches with a single union query, by default 1
+        cache_path : str, optional
+            Path of a JSON file caching the regex matches of each table. Tables whose
+            cached schema is unchanged and younger than cache_ttl are not rescanned,
+            by default None (no caching)
+        cache_ttl : float, optional
+            Maximum age in seconds of reused cache entries, by default 86400 (one day)
+        project : bool, optional
+            If True, only the string, dynamic and guid columns listed in
+            qry_prov.schema are queried, by default True
+        short_circuit : bool, optional
+            If True, stops matching a column once its entity is decided, see
+            search_single_table. Ignored with match_processes > 1, by default False
+        index_values : bool, optional
+            If True, adds the sampled string values to the value_index used by
+            lookup_value and the query generators (TimeGenerated is also queried
+            for the first and last seen times), by default False
+
+        Returns
+        -------
+        Dict
+            Output of create_entity_map function. Returns reverse mapping from entities to table and column.
+        """        
+        if tables is None:
+            tables = self.selected_tables.selected_items
+        tables = list(tables)
+        short_circuit = short_circuit and match_processes <= 1
+        params = self._detection_params(sample_size, distinct, project, short_circuit)
+        cached_regexes = (
+            self._read_cached_matches(cache_path, tables, cache_ttl, params) if cache_path else {}
+        )
+        scan_tables = [table for table in tables if table not in cached_regexes]
+        columns = (
+            {
+                table: string_schema_columns(self.qry_prov.schema.get(table))
+                for table in scan_tables
+            }
+            if project
+            else None
+        )
+        if columns and index_values:
+            for table, table_columns in columns.items():
+                if table_columns and "TimeGenerated" in (self.qry_prov.schema.get(table) or {}):
+                    table_columns.append("TimeGenerated")
+        samples = self._sample_tables(
+            scan_tables, sample_size, max_workers, batch_size, columns
+        )
+        if index_values:
+            samples = self._index_samples(samples, sample_size)
+        if match_processes > 1:
+            output_regexes = self._search_tables_in_processes(
+                samples, distinct, match_processes
+            )
+        elif short_circuit:
+            # Every table starts from the hit rates learned before this call and
+            # they are merged back in table order, so the evaluated regexes don't
+            # depend on the order the samples complete in
+            start_stats = {name: list(counts) for name, counts in self._regex_stats.items()}
+            table_stats, output_regexes = {}, {}
+            for table, df in samples:
+                table_stats[table] = defaultdict(
+                    lambda: [0, 0], {name: list(counts) for name, counts in start_stats.items()}
+                )
+                output_regexes[table] = self.search_single_table(
+                    df, distinct=distinct, short_circuit=True, regex_stats=table_stats[table]
+                )
+            for table in tables:
+                for name, (hits, evaluations) in table_stats.get(table, {}).items():
+                    start_hits, start_evaluations = start_stats.get(name, (0, 0))
+                    self._regex_stats[name][0] += hits - start_hits
+                    self._regex_stats[name][1] += evaluations - start_evaluations
+        else:
+            output_regexes = {
+                table: self.search_single_table(df, distinct=distinct)
+                for table, df in samples
+            }
+        if cache_path:
+            self._write_cached_matches(cache_path, output_regexes, params)
+        output_regexes.update(cached_regexes)
+        # Keep the requested table order regardless of query completion order
+        self._regex_matches = {table: output_regexes[table] for table in tables}
+        return self.entity_map
+
+
+    def _schema_hash(self, table):
+        """Return a hash of the table schema and the regex definitions."""
+        schema = {
+            "schema": self.qry_prov.schema.get(table),
+            "regexes": self.regexes,
+        }
+        return hashlib.sha256(
+            json.dumps(schema, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+
+    def _detection_params(self, sample_size, distinct, project, short_circuit):
+        """Return the detect_entities settings that affect the regex matches of a table."""
+        engine = self.regex_engine
+        return {
+            "sample_size": str(sample_size),
+            "distinct": bool(distinct),
+            "project": bool(project),
+            "short_circuit": bool(short_circuit),
+            "max_value_length": self.max_value_length,
+            "regex_engine": engine if isinstance(engine, str) else getattr(engine, "__qualname__", str(engine)),
+        }
+
+
+    def _read_cached_matches(self, path, tables, ttl=86400, params=None):
+        """
+        Return the cached regex matches that can be reused for the given tables.
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON cache file.
+        tables : List[str]
+            Tables to look up.
+        ttl : float, optional
+            Maximum age in seconds of reused entries, by default 86400
+        params : Dict, optional
+            Detection settings (see _detection_params), entries created
+            with other settings are not reused, by default None
+
+        Returns
+        -------
+        Dict[str, Dict[str, Dict[str, Tuple(float, float)]]]
+            {table: {column: {regex: (non-blank-matches, all-matches)}}} for
+            tables with an unchanged schema and a fresh cache entry created
+            with the same settings.
+        """
+        cache = read_json_file(path) or {}
+        cached_regexes = {}
+        for table in tables:
+            entry = cache.get(table)
+            if (
+                not entry
+                or entry["schema_hash"] != self._schema_hash(table)
+                or entry.get("params") != params
+                or time.time() - entry["timestamp"] > ttl
+            ):
+                continue
+            # JSON stores the match tuples as lists
+            cached_regexes[table] = {
+                col: {name: tuple(ratios) for name, ratios in matches.items()}
+                for col, matches in entry["regex_matches"].items()
+            }
+        return cached_regexes
+
+
+    def _write_cached_matches(self, path, regex_matches, params=None):
+        """
+        Add or replace the cache entries of the given tables.
+
+        Parameters
+        ----------
+        path : str
+            Path of the JSON cache file.
+        regex_matches : Dict
+            {table: {column: {regex: (non-blank-matches, all-matches)}}}
+        params : Dict, optional
+            Detection settings the matches were created with, by default None
+        """
+        if not regex_matches:
+            return
+        cache = read_json_file(path) or {}
+        timestamp = time.time()
+        for table, matches in regex_matches.items():
+            cache[table] = {
+                "schema_hash": self._schema_hash(table),
+                "timestamp": timestamp,
+                "params": params,
+                "regex_matches": matches,
+            }
+        save_to_json_file(cache, path)
+
+
+    def _search_tables_in_processes(self, samples, distinct=False, processes=2):
         """
-        For each column apply priority and match percentage logic to assign an entity to the column.
+        Apply every regex to every column of the sampled tables using a process pool.
+
+        Each (table, column) is a separate unit of work. Workers compile the
+        regexes once and return only the match counts, which are converted
+        to the same ratios as search_single_table.
 
         Parameters
         ----------
-        regex_matches : Dict
-            Output of match_entities function. Dict showing all columns that matched one or more regexes. 
-            Dict structure is {table: {column: {regex: (non-blank-matches, all-matches)}}}
+        samples : Iterable[Tuple[str, DataFrame]]
+            Table names and sampled rows, e.g. the output of _sample_tables.
+        distinct : bool, optional
+            If True, matches distinct values weighted by their counts, by default False
+        processes : int, optional
+            Number of worker processes, by default 2
 
         Returns
         -------
-        Dict
-            Dict structure is {table: {column: entity}}.
-        """        
-        entity_assignments = {}
-        for table, cols in regex_matches.items():
-            entity_assignments[table] = {}
-            for col, matches in cols.items():
-                highest_perc = 0
-                highest_pri = 3
-                isMatch = False
-                for rgx_match, perc_match in matches.items():
-                    # Ignore GUID matches
-                    if rgx_match == "GUID_REGEX":
-                        continue
-                    # Choose entity corresponding to the regex with the highest total match percentage
-                    # If tie, choose entity with highest priority
-                    # 0 has highest priority, 2 is the lowest
-                    isMatch = True
-                    regex_priority = int(
-                        self.regexes.get(rgx_match, {}).get("priority", 0)
+        Dict[str, Dict[str, Dict[str, Tuple(float, float)]]]
+            {table: {column: {regex: (non-blank-matches, all-matches)}}}
+        """
+        futures = {}
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_match_worker,
+            initargs=(self.regexes, self.regex_engine, self.max_value_length),
+        ) as executor:
+            # Submit the columns of each table as soon as its sample arrives
+            for table, df in samples:
+                futures[table] = {
+                    col: (
+                        len(df[col]),
+                        executor.submit(
+                            _count_matches_worker,
+                            self._column_value_counts(df[col], distinct),
+                        ),
                     )
-                    if regex_priority < highest_pri:
-                        highest_pri = regex_priority
-                        rgx = rgx_match
-                    if perc_match[0] > highest_perc:
-                        highest_perc = perc_match[0]
-                        regex = rgx_match
-                    elif perc_match[0] == highest_perc:
-                        regex = rgx
-                if isMatch:
-                    entity_name = self.regexes.get(regex, {}).get("entity")
-                    entity_assignments[table][col] = entity_name
-
-        return entity_assignments
+                    for col in self._string_columns(df)
+                }
+            accumulator = MatchAccumulator()
+            for table, col_futures in futures.items():
+                accumulator.add_table(table)
+                for col, (num_rows, future) in col_futures.items():
+                    accumulator.add(table, col, num_rows, *future.result())
+        return accumulator.regex_matches()
 
-    def create_entity_map(self, table_map):
+
+    def accumulate_matches(self, table_name, chunks, accumulator=None, distinct=False):
         """
-        Iterates through the interpreted results to create a dict keyed by entity type.
+        Count regex matches of a table that is read chunk by chunk.
+
+        Only the counts are kept, so the memory used is bounded by the chunk
+        size. The result of search_single_table on the whole table equals
+        accumulator.regex_matches() after all of its chunks are added.
 
         Parameters
         ----------
-        table_map : Dict
-            Output of interpret_matches function. Dict of column-entity mappings keyed by table and column.
-            Dict structure is {table: {column: entity}}.
+        table_name : str
+            Name of the table the chunks belong to.
+        chunks : Iterable[DataFrame]
+            Chunks or pages of the table, e.g. from pd.read_csv(chunksize=...)
+            or a generator of query results.
+        accumulator : MatchAccumulator, optional
+            Accumulator to add the counts to, by default a new one
+        distinct : bool, optional
+            If True, matches distinct values weighted by their counts, by default False
 
         Returns
         -------
-        Dict
-            Dict structure is Dict: {entity: [(table, col)]}.
-        """        
-        entity_dict = {}
-        for table, cols in table_map.items():
-            for col, entity in cols.items():
-                entity_dict[entity] = []
-        for table, cols in table_map.items():
-            for col, entity in cols.items():
-                entity_dict[entity].append((table, col))
-        return entity_dict
+        MatchAccumulator
+            The updated accumulator.
+        """
+        if accumulator is None:
+            accumulator = MatchAccumulator()
+        accumulator.add_table(table_name)
+        for chunk in chunks:
+            # Empty columns are kept since later chunks may contain values
+            str_cols = set(self._string_columns(chunk))
+            for col in chunk.columns:
+                if col not in str_cols and not chunk[col].isna().all():
+                    continue
+                num_blanks, match_counts = self._count_column(
+                    chunk[col],
+                    self._compiled_regexes,
+                    distinct,
+                    self._prefilters,
+                    self.max_value_length,
+                )
+                accumulator.add(table_name, col, len(chunk[col]), num_blanks, match_counts)
+        return accumulator
 
 
-    # Run methods
+    def interpret_accumulated(self, accumulator):
+        """
+        Compute the match ratios of an accumulator and interpret them.
+
+        Parameters
+        ----------
+        accumulator : MatchAccumulator
+            Accumulated (and possibly merged) match counts.
+
+        Returns
+        -------
+        Dict
+            Output of create_entity_map function. Returns reverse mapping from entities to table and column.
+        """
+        self._regex_matches = accumulator.regex_matches()
+        return self.entity_map
 
-    def detect_entities(self, tables=None, sample_size="100"):
+
+    def detect_entities_adaptive(
+        self,
+        tables=None,
+        initial_size=100,
+        max_size=10000,
+        confidence=0.95,
+        min_ratio=0.01,
+        row_budget=None,
+        byte_budget=None,
+        max_workers=1,
+    ):
         """
-        Runs the search_single_table, interpret_matches, and create_entity_map functions on given tables.
-        Persists/saves returned values in instance result attributes.
+        Detect entities, sampling more rows only for columns with an ambiguous entity.
+
+        Each table is first sampled with initial_size rows. After each round the
+        confidence interval of the match ratio of every regex is computed for each
+        column. Columns where the interval of the winning entity overlaps with the
+        interval of another entity, and columns without a match that could still
+        match min_ratio of their values, are sampled again with twice as many rows
+        in total. This stops once the entities are decided, max_size rows have been
+        sampled for the table, the table has been read completely (the sample
+        returned fewer rows than requested) or the budget is exhausted.
 
         Parameters
         ----------
         tables : List[str]
-            Array of tables in string format to iterate over. 
+            Array of tables in string format to iterate over.
             If no tables are explictly passed in as a parameter, the tables selected in select_tables() function are used.
-        sample_size : str, optional
-            Number of events/rows in each table to sample, by default "100"
+        initial_size : int, optional
+            Number of events/rows in each table sampled in the first round, by default 100
+        max_size : int, optional
+            Maximum number of events/rows sampled from each table, by default 10000
+        confidence : float, optional
+            Confidence level of the match ratio intervals, by default 0.95
+        min_ratio : float, optional
+            Columns without any match are resampled until the upper bound of the
+            interval of the share of matching rows is below min_ratio, by default 0.01
+        row_budget : int, optional
+            Maximum number of rows fetched by the run, by default None (no limit).
+            Tables that don't fit in the budgets are not sampled and have no
+            entities in table_map, they are listed in unsampled_tables.
+        byte_budget : int, optional
+            Maximum (in-memory) size in bytes of the data fetched by the run,
+            by default None (no limit). The size of each round is estimated
+            from the rows already fetched from each table (ESTIMATED_VALUE_BYTES
+            per value before that) and only the tables that fit are sampled.
+        max_workers : int, optional
+            Number of sample queries to run concurrently, by default 1
 
         Returns
         -------
         Dict
             Output of create_entity_map function. Returns reverse mapping from entities to table and column.
-        """        
+        """
         if tables is None:
             tables = self.selected_tables.selected_items
-        output_regexes = {}
-        for table in tqdm(tables):
-            df = self.qry_prov.exec_query(f"{table} | sample {sample_size}")
-            output_regexes[table] = self.search_single_table(df)
-        self._regex_matches = output_regexes
-        self.table_map = self.interpret_matches(self._regex_matches)
-        self.entity_map = self.create_entity_map(self.table_map)
-        return self.entity_map
+        tables = list(tables)
+        z_score = NormalDist().inv_cdf((1 + confidence) / 2)
+        accumulator = MatchAccumulator()
+        for table in tables:
+            accumulator.add_table(table)
+        columns = {
+            table: string_schema_columns(self.qry_prov.schema.get(table))
+            for table in tables
+        }
+        rows_used, bytes_used = 0, 0
+        # rows and bytes fetched from each table, to estimate the size of its rows
+        table_usage = defaultdict(lambda: [0, 0])
+        sampled = set()
+        sample_size, total_size = initial_size, 0
+        while columns and total_size < max_size:
+            rows_left = math.inf if row_budget is None else row_budget - rows_used
+            bytes_left = math.inf if byte_budget is None else byte_budget - bytes_used
+            row_bytes = {
+                table: (
+                    table_usage[table][1] / table_usage[table][0]
+                    if table_usage[table][0]
+                    else ESTIMATED_VALUE_BYTES * max(1, len(cols))
+                )
+                for table, cols in columns.items()
+            }
+            # Only sample as many tables as the remaining budgets allow
+            affordable = {}
+            for table, cols in columns.items():
+                if sample_size > rows_left or sample_size * row_bytes[table] > bytes_left:
+                    continue
+                affordable[table] = cols
+                rows_left -= sample_size
+                bytes_left -= sample_size * row_bytes[table]
+            if not affordable:
+                # Sample fewer rows of the first table if that still fits
+                table = next(iter(columns))
+                sample_size = int(min(rows_left, bytes_left // row_bytes[table], sample_size))
+                if sample_size < 1:
+                    break
+                affordable = {table: columns[table]}
+            columns = affordable
+            samples = self._sample_tables(
+                list(columns), str(sample_size), max_workers, columns=columns
+            )
+            complete = set()
+            for table, df in samples:
+                sampled.add(table)
+                df_bytes = int(df.memory_usage(deep=True).sum())
+                rows_used += len(df)
+                bytes_used += df_bytes
+                table_usage[table][0] += len(df)
+                table_usage[table][1] += df_bytes
+                if len(df) < sample_size:
+                    # The whole table was read, resampling would only count rows again
+                    complete.add(table)
+                self.accumulate_matches(table, [df], accumulator)
+            total_size += sample_size
+            sample_size = min(total_size, max_size - total_size)
+            # Only sample the undecided columns in the next round
+            ambiguous = {
+                table: self._ambiguous_columns(
+                    accumulator.counts[table], z_score, min_ratio
+                )
+                for table in columns
+                if table not in complete
+            }
+            columns = {table: cols for table, cols in ambiguous.items() if cols}
+        self.unsampled_tables = [table for table in tables if table not in sampled]
+        if self.unsampled_tables:
+            print(
+                f"warning: the budget ran out before {len(self.unsampled_tables)} of "
+                f"{len(tables)} tables were sampled, see unsampled_tables"
+            )
+        return self.interpret_accumulated(accumulator)
+
+
+    def _ambiguous_columns(self, col_counts, z_score, min_ratio=0.01):
+        """
+        Return the columns whose winning entity is not statistically decided.
+
+        Parameters
+        ----------
+        col_counts : Dict[str, List]
+            {column: [rows, blanks, {regex: matches}]}
+        z_score : float
+            z-score of the confidence level of the match ratio intervals.
+        min_ratio : float, optional
+            Smallest match ratio that needs to be detected in columns without
+            matches, by default 0.01
+
+        Returns
+        -------
+        List[str]
+            Columns where the confidence interval of the winning entity overlaps
+            with the interval of a different entity, or with no matches yet.
+        """
+        ambiguous_cols = []
+        for col, (num_rows, num_blanks, match_counts) in col_counts.items():
+            num_non_blanks = num_rows - num_blanks
+            candidates = {
+                name: num_matches
+                for name, num_matches in match_counts.items()
+                if name != "GUID_REGEX" and num_matches > 0
+            }
+            if not candidates:
+                # An entity might still match a small share of the rows
+                if _wilson_interval(0, num_rows, z_score)[1] >= min_ratio:
+                    ambiguous_cols.append(col)
+                continue
+            ratios = self._match_ratios(num_rows, num_blanks, candidates)
+            winner = self.interpret_matches({"": {col: ratios}})[""].get(col)
+            winner_matches = max(
+                num_matches
+                for name, num_matches in candidates.items()
+                if self.regexes.get(name, {}).get("entity") == winner
+            )
+            winner_low, _ = _wilson_interval(winner_matches, num_non_blanks, z_score)
+            # Equal counts are decided by priority so more rows would not help
+            if any(
+                _wilson_interval(num_matches, num_non_blanks, z_score)[1] >= winner_low
+                for name, num_matches in candidates.items()
+                if self.regexes.get(name, {}).get("entity") != winner
+                and num_matches != winner_matches
+            ):
+                ambiguous_cols.append(col)
+        return ambiguous_cols
 
 
     def detect_entities_random(self, num_tables=3, sample_size=100):
@@ -495,12 +3326,18 @@ class EntityIdentifier:
         display(self.selected_tables)
 
 
-    def detect_entities_all_tables(self):
+    def detect_entities_all_tables(self, **kwargs):
         """
         Run detect_entities function on all tables.
+
+        Other Parameters
+        ----------------
+        kwargs :
+            Passed to detect_entities (e.g. sample_size, max_workers,
+            match_processes, batch_size).
         """
         # List of all tables
-        self.detect_entities(self.qry_prov.schema.keys())
+        self.detect_entities(self.qry_prov.schema.keys(), **kwargs)
 
 
     # HTML Tables
@@ -534,44 +3371,211 @@ class EntityIdentifier:
 
     # Visualizations
 
-    def show_entity_graph(self, interactive=True):
+    def entity_graph(self, collapse=True):
         """
-        Shows a network graph of which of the selected tables contain which entities.
+        Return a graph of the entities and the tables containing them.
+
+        Parameters
+        ----------
+        collapse : bool, optional
+            If True, tables containing exactly the same entities are collapsed
+            into a single "group:" node, by default True
+
+        Returns
+        -------
+        nx.Graph
+            Nodes "entity:<entity>", "table:<table>" and "group:<n>" with kind,
+            label and members (tables) attributes. Edges have the number of
+            columns as weight.
         """
-        G = nx.Graph()
-        val_map = {}
-        for entity, pair in self.entity_map.items():
-            for table, col in pair:
-                G.add_edge(entity, table, column=col)
-                G.nodes[table]['color'] = 'red'
-                val_map[table] = 1.0
-
-        if interactive:
-            nt = Network(notebook=False)
-            nt.from_nx(G)
-            nt.show('nx.html')
+        table_entities = defaultdict(Counter)
+        for entity, pairs in self.entity_map.items():
+            for table, _ in pairs:
+                table_entities[table][entity] += 1
+        signatures = defaultdict(list)
+        for table, entities in table_entities.items():
+            signatures[frozenset(entities) if collapse else table].append(table)
+        graph = nx.Graph()
+        for entity in self.entity_map:
+            graph.add_node(f"entity:{entity}", kind="entity", label=entity, members=[])
+        for idx, tables in enumerate(signatures.values()):
+            if len(tables) == 1:
+                node = f"table:{tables[0]}"
+                graph.add_node(node, kind="table", label=tables[0], members=tables)
+            else:
+                node = f"group:{idx}"
+                graph.add_node(node, kind="group", label=f"{len(tables)} tables", members=tables)
+            for table in tables:
+                for entity, num_cols in table_entities[table].items():
+                    edge = (f"entity:{entity}", node)
+                    weight = graph.edges[edge]["weight"] if graph.has_edge(*edge) else 0
+                    graph.add_edge(*edge, weight=weight + num_cols)
+        return graph
+
+
+    def entity_graph_json(self, collapse=True, path=None):
+        """
+        Return the entity graph and its cached layout as compact JSON.
+
+        Group members are not included, they are loaded on demand with
+        graph_neighbourhood_json.
+
+        Parameters
+        ----------
+        collapse : bool, optional
+            If True, collapses tables with the same entities, by default True
+        path : str, optional
+            File to write the JSON to, by default None
+
+        Returns
+        -------
+        Dict
+            {"hash": graph hash, "nodes": [[id, label, kind, x, y, members]],
+            "edges": [[source index, target index, weight]]}
+        """
+        data = self._graph_json(self.entity_graph(collapse))
+        if path:
+            with open(path, "w") as fp:
+                json.dump(data, fp, separators=(",", ":"))
+        return data
+
+
+    def graph_neighbourhood_json(self, node: str, offset=0, limit=200):
+        """
+        Return the tables and columns behind a node of the entity graph, a page at a time.
+
+        Parameters
+        ----------
+        node : str
+            Node id, "entity:<entity>", "table:<table>" or "group:<n>" of entity_graph(collapse=True).
+        offset : int, optional
+            Index of the first table to return, by default 0
+        limit : int, optional
+            Maximum number of tables to return, by default 200
+
+        Returns
+        -------
+        Dict
+            {"node": node, "total": number of tables, "tables": {table: [[column, entity]]}}
+        """
+        kind, _, name = node.partition(":")
+        if kind == "group":
+            graph = self.entity_graph()
+            tables = graph.nodes[node]["members"] if node in graph else []
+        elif kind == "entity":
+            tables = list(dict.fromkeys(table for table, _ in self.entity_map.get(name, [])))
         else:
-            plt.figure(3,figsize=(12,12)) 
-            values = [val_map.get(node, 0) for node in G.nodes()]
-            nx.draw_networkx(G, cmap=plt.get_cmap('spring'), node_color=values)
-            plt.show()
+            tables = [name] if name in self.table_map else []
+        page = tables[offset : offset + limit]
+        return {
+            "node": node,
+            "total": len(tables),
+            "tables": {
+                table: [
+                    [col, entity]
+                    for col, entity in self.table_map.get(table, {}).items()
+                    if kind != "entity" or entity == name
+                ]
+                for table in page
+            },
+        }
+
+
+    def show_entity_graph(self, interactive=True, collapse=True):
+        """
+        Shows a network graph of which of the selected tables contain which entities.
+
+        Tables with the same entities are collapsed into one node and the
+        layout is cached, see entity_graph and entity_graph_json.
+        """
+        self._show_graph_json(self.entity_graph_json(collapse), interactive)
 
 
-    def show_single_entity_graph(self, entity: str):
+    def show_single_entity_graph(self, entity: str, limit=200):
         """
         Shows a network graph of the tables and columns for a single entity.
+
+        Only the first limit tables are shown, see graph_neighbourhood_json.
         """
-        G = nx.Graph()
+        neighbourhood = self.graph_neighbourhood_json(f"entity:{entity}", limit=limit)
+        graph = nx.Graph()
+        graph.add_node(f"entity:{entity}", kind="entity", label=entity, members=[])
+        for table, cols in neighbourhood["tables"].items():
+            graph.add_node(f"table:{table}", kind="table", label=table, members=[table])
+            graph.add_edge(f"entity:{entity}", f"table:{table}", weight=len(cols))
+            for col, _ in cols:
+                graph.add_node(f"column:{table}.{col}", kind="column", label=col, members=[])
+                graph.add_edge(f"table:{table}", f"column:{table}.{col}", weight=1)
+        self._show_graph_json(self._graph_json(graph))
+        if neighbourhood["total"] > limit:
+            print(f"Showing {limit} of {neighbourhood['total']} tables")
+
+
+    def _graph_json(self, graph: nx.Graph) -> Dict:
+        """Return the compact JSON form of a graph with its cached layout."""
+        positions = self.layout_cache.layout(graph)
+        node_ids = {node: idx for idx, node in enumerate(graph.nodes())}
+        return {
+            "hash": graph_hash(graph),
+            "nodes": [
+                [node, attrs["label"], attrs["kind"], *positions[node], len(attrs["members"])]
+                for node, attrs in graph.nodes(data=True)
+            ],
+            "edges": [
+                [node_ids[src], node_ids[dst], attrs["weight"]]
+                for src, dst, attrs in graph.edges(data=True)
+            ],
+        }
 
-        for table, col in self.entity_map[entity]:
-            G.add_edge(entity, table)
-            G.add_edge(table, col)
-            G.nodes[table]['color'] = 'red'
-            G.nodes[col]['color'] = 'orange'
 
-        nt = Network(notebook=False)
-        nt.from_nx(G)
-        nt.show('nx.html')
+    @staticmethod
+    def _show_graph_json(data, interactive=True):
+        """Draws entity_graph_json output with plotly, or matplotlib if not interactive."""
+        colors = {"entity": "royalblue", "table": "red", "group": "darkred", "column": "orange"}
+        nodes, edges = data["nodes"], data["edges"]
+        if not interactive:
+            plt.figure(3, figsize=(12, 12))
+            for src, dst, _ in edges:
+                plt.plot([nodes[src][3], nodes[dst][3]], [nodes[src][4], nodes[dst][4]], color="lightgrey", zorder=1)
+            plt.scatter(
+                [node[3] for node in nodes],
+                [node[4] for node in nodes],
+                c=[colors[node[2]] for node in nodes],
+                zorder=2,
+            )
+            for node in nodes:
+                plt.annotate(node[1], (node[3], node[4]))
+            plt.axis("off")
+            plt.show()
+            return
+        edge_x, edge_y = [], []
+        for src, dst, _ in edges:
+            edge_x.extend([nodes[src][3], nodes[dst][3], None])
+            edge_y.extend([nodes[src][4], nodes[dst][4], None])
+        fig = go.Figure(
+            data=[
+                go.Scattergl(x=edge_x, y=edge_y, mode="lines", line=dict(color="lightgrey", width=1), hoverinfo="none"),
+                go.Scattergl(
+                    x=[node[3] for node in nodes],
+                    y=[node[4] for node in nodes],
+                    mode="markers+text",
+                    text=[node[1] for node in nodes],
+                    textposition="top center",
+                    hovertext=[node[0] for node in nodes],
+                    marker=dict(
+                        color=[colors[node[2]] for node in nodes],
+                        size=[10 + min(node[5], 20) for node in nodes],
+                    ),
+                ),
+            ]
+        )
+        fig.update_layout(
+            showlegend=False,
+            xaxis=dict(visible=False),
+            yaxis=dict(visible=False),
+            height=800,
+        )
+        fig.show()
 
 
     def show_entity_dist(self):
@@ -682,14 +3686,28 @@ class EntityIdentifier:
 
     # Autogenerating queries
 
-    def generate_query(self, entity_type: str, search_value: str, query_template=QUERY_TEMP):
+    def generate_query(
+        self,
+        entity_type: str,
+        search_value: str,
+        query_template=None,
+        use_index=False,
+        start=None,
+        end=None,
+        cols=None,
+    ):
         """
         Generate KQL queries that match the provided template.
 
         Args:
             entity_type (str): Entity of the particular value to search for in the table schema.
             search_value (str): Value of the instance to search for.
-            query_template (str): KQL query template.
+            query_template (str): KQL query template such as QUERY_TEMP, by default the queries are
+                built by pivot_query (time filter first, escaped value, has prefilter).
+            use_index (bool): Skip columns that the value index or column filters rule out.
+            start (datetime): Start of the time window, by default unbounded.
+            end (datetime): End of the time window, by default unbounded.
+            cols (List[str]): Columns to project, by default all columns.
 
         Returns:
             List: List of generated queries.
@@ -697,29 +3715,246 @@ class EntityIdentifier:
         queries = []
         for table, matches in self.table_map.items():
             for col, entity in matches.items():
-                if entity_type == entity:
-                    # print("found match", table, col, entity)
+                if entity_type == entity and not self._ruled_out(
+                    table, col, search_value, use_index, start
+                ):
+                    if query_template is None:
+                        queries.append(
+                            self._pivot_query(table, [col], entity_type, search_value, start, end, cols)
+                        )
+                        continue
                     query = query_template.format(table=table, ColumnName=col)
                     queries.append(query.format(MySearch=search_value))
         return queries
 
 
-    def run_queries(self, queries: List[str]):
+    def _pivot_query(self, table, columns, entity_type, search_value, start, end, cols):
+        """Return pivot_query for a table, using the schema to drop missing columns."""
+        schema = self.qry_prov.schema.get(table)
+        has_time = not schema or "TimeGenerated" in schema
+        project = [col for col in cols if not schema or col in schema] if cols else None
+        return pivot_query(
+            table,
+            columns,
+            search_value,
+            case_sensitive=entity_type not in CASE_INSENSITIVE_ENTITIES,
+            start=start,
+            end=end,
+            project=project,
+            time_column="TimeGenerated" if has_time else None,
+        )
+
+
+    def run_queries(self, queries: List[str], max_workers=1, timeout=None):
         """
         Runs the queries.
 
         Args:
             queries (List[str])): Output of generate_query function.
+            max_workers (int): Number of queries to run concurrently, results are shown as they arrive.
+            timeout (float): Seconds after which a running query is abandoned.
         """
-        for query in queries:
-            query_result = self.qry_prov.exec_query(query)
+        for query, query_result in self.iter_query_results(queries, max_workers, timeout):
             if len(query_result) > 0:
                 print(query)
                 print("-" * len(query))
                 display(query_result)
 
 
-    def generate_table_queries(self, entity_type: str, search_value: str, query_template=QUERY_TEMP):
+    def iter_query_results(self, queries: List[str], max_workers=4, timeout=None):
+        """
+        Run queries concurrently, yielding the results as they complete.
+
+        Closing the generator (e.g. breaking out of the loop) cancels the
+        queries that haven't started. The status, latency and row count of
+        every submitted query are recorded in query_stats. The status is
+        "ok", "error", "timeout", "cancelled" (not started before the
+        generator was closed) or "abandoned" (running or not yet yielded
+        when the generator was closed).
+
+        Parameters
+        ----------
+        queries : List[str]
+            KQL queries, None entries (e.g. a fully ruled out union) are skipped.
+        max_workers : int, optional
+            Number of queries to run concurrently, by default 4
+        timeout : float, optional
+            Seconds after which a running query is abandoned. The provider call
+            can't be interrupted, so its worker stays busy until it returns,
+            by default None (no timeout)
+
+        Yields
+        ------
+        Tuple[str, DataFrame]
+            Query and its results, in completion order. Failed and timed out
+            queries are not yielded.
+        """
+        self.query_stats = []
+        queries = [query for query in queries if query]
+        started = {}
+
+        def run(idx, query):
+            started[idx] = time.perf_counter()
+            return self.qry_prov.exec_query(query)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = {
+            executor.submit(run, idx, query): (idx, query)
+            for idx, query in enumerate(queries)
+        }
+        pending = set(futures)
+        recorded = set()
+        try:
+            with tqdm(total=len(queries)) as progress:
+                while pending:
+                    done, pending = wait(
+                        pending,
+                        timeout=self._next_deadline(pending, futures, started, timeout),
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        idx, query = futures[future]
+                        progress.update()
+                        try:
+                            result = future.result()
+                        except Exception as err:  # pylint: disable=broad-except
+                            result = err
+                        latency = time.perf_counter() - started[idx]
+                        recorded.add(future)
+                        if self._record_query(query, result, latency):
+                            yield query, result
+                    if timeout is None:
+                        continue
+                    now = time.perf_counter()
+                    expired = {
+                        future
+                        for future in pending
+                        if now - started.get(futures[future][0], now) >= timeout
+                    }
+                    for future in expired:
+                        progress.update()
+                        recorded.add(future)
+                        self._record_query(futures[future][1], None, timeout, "timeout")
+                    pending -= expired
+        finally:
+            now = time.perf_counter()
+            for future, (idx, query) in futures.items():
+                if future in recorded:
+                    continue
+                if future.cancel():
+                    self._record_query(query, None, 0.0, "cancelled")
+                else:
+                    self._record_query(query, None, now - started.get(idx, now), "abandoned")
+            executor.shutdown(wait=False)
+
+
+    @staticmethod
+    def _next_deadline(pending, futures, started, timeout):
+        """Return the seconds until the first running query times out."""
+        if timeout is None:
+            return None
+        now = time.perf_counter()
+        deadlines = [
+            started[futures[future][0]] + timeout
+            for future in pending
+            if futures[future][0] in started
+        ]
+        # Queued queries time out at the earliest one timeout after they start
+        return max(0.0, min(deadlines) - now) if deadlines else timeout
+
+
+    def _record_query(self, query, result, latency, status=None):
+        """Add a query to query_stats, returns True if it succeeded."""
+        if status is None:
+            status = "ok" if isinstance(result, pd.DataFrame) else "error"
+        self.query_stats.append(
+            {
+                "query": query,
+                "status": status,
+                "latency": latency,
+                "rows": len(result) if status == "ok" else 0,
+            }
+        )
+        if status in ("error", "timeout"):
+            print(f"warning: query {status}: {query.strip().splitlines()[0]} ...")
+        return status == "ok"
+
+
+    async def aiter_query_results(self, queries: List[str], max_workers=4, timeout=None):
+        """
+        Run queries concurrently, yielding the results as they complete (asyncio version).
+
+        Cancelling the consuming task or closing the generator cancels the
+        queries that haven't started. Every submitted query is recorded in
+        query_stats, see iter_query_results.
+
+        Parameters
+        ----------
+        queries : List[str]
+            KQL queries, None entries (e.g. a fully ruled out union) are skipped.
+        max_workers : int, optional
+            Number of queries to run concurrently, by default 4
+        timeout : float, optional
+            Seconds after which a running query is abandoned, by default None (no timeout)
+
+        Yields
+        ------
+        Tuple[str, DataFrame]
+            Query and its results, in completion order. Failed and timed out
+            queries are not yielded.
+        """
+        self.query_stats = []
+        queries = [query for query in queries if query]
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_workers)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        started = {}
+        recorded = set()
+
+        async def run(idx, query):
+            async with semaphore:
+                start = started[idx] = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(
+                        loop.run_in_executor(executor, self.qry_prov.exec_query, query),
+                        timeout,
+                    )
+                except asyncio.TimeoutError:
+                    return idx, None, timeout, "timeout"
+                except Exception as err:  # pylint: disable=broad-except
+                    result = err
+                return idx, result, time.perf_counter() - start, None
+
+        tasks = [asyncio.ensure_future(run(idx, query)) for idx, query in enumerate(queries)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                idx, result, latency, status = await next_done
+                recorded.add(idx)
+                if self._record_query(queries[idx], result, latency, status):
+                    yield queries[idx], result
+        finally:
+            now = time.perf_counter()
+            for idx, task in enumerate(tasks):
+                task.cancel()
+                if idx in recorded:
+                    continue
+                if idx in started:
+                    self._record_query(queries[idx], None, now - started[idx], "abandoned")
+                else:
+                    self._record_query(queries[idx], None, 0.0, "cancelled")
+            executor.shutdown(wait=False)
+
+
+    def generate_table_queries(
+        self,
+        entity_type: str,
+        search_value: str,
+        query_template=None,
+        use_index=False,
+        start=None,
+        end=None,
+        cols=None,
+    ):
         """
         Helper function to generate the individual queries to be formatted in a union query.
 
@@ -730,17 +3965,36 @@ class EntityIdentifier:
         search_value : str
             Value of the instance to search for.
         query_template : [type], optional
-            KQL query template., by default QUERY_TEMP
+            KQL query template such as QUERY_TEMP, by default the queries are built by pivot_query
+        use_index : bool, optional
+            If True, skips columns that the value index or column filters rule out, by default False
+        start : datetime, optional
+            Start of the time window, by default None (unbounded)
+        end : datetime, optional
+            End of the time window, by default None (unbounded)
+        cols : [str], optional
+            Columns that each table query projects, by default all columns
 
         Returns
         -------
         Dict
             Dict where the key is the table and the value is the query.
         """
+        if query_template is None:
+            table_columns = defaultdict(list)
+            for table, col in self.entity_map.get(entity_type, []):
+                if not self._ruled_out(table, col, search_value, use_index, start):
+                    table_columns[table].append(col)
+            return {
+                table: self._pivot_query(table, columns, entity_type, search_value, start, end, cols)
+                for table, columns in table_columns.items()
+            }
         queries = {}
         for entity, pair in self.entity_map.items():
             if entity == entity_type:
                 for table, col in pair:
+                    if self._ruled_out(table, col, search_value, use_index, start):
+                        continue
                     if table not in queries:
                         query = query_template.format(table=table, ColumnName=col)
                         queries[table] = query.format(MySearch=search_value)
@@ -752,31 +4006,23 @@ class EntityIdentifier:
     def format_union_query(self, queries, cols):
         """
         Helper function that takes the dict from generate_table_queries and returns the union query.
+        Returns None if there are no table queries.
         """
-        qry_list = list(queries.values())
-        fin_query = """(union isfuzzy= true
-"""
-        for query in qry_list:
-            
-            t = "({query})"
-            if query != qry_list[-1]:
-                t = t + ',\n'
-            fin_query = fin_query + t.format(query=query)
-        end = """)
-| project """
-        fin_query = fin_query + end
-        for col in cols:
-            fin_query = fin_query + col
-            if col != cols[-1]:
-                fin_query = fin_query + ', '
-        
-        return fin_query
+        if not queries:
+            return None
+        union = ",\n".join(f"({query})" for query in queries.values())
+        return f"(union isfuzzy= true\n{union})\n| project {', '.join(kql_name(col) for col in cols)}"
 
     
-    def generate_union_query(self, entity_type: str, search_value: str, cols):
+    def generate_union_query(
+        self, entity_type: str, search_value: str, cols, use_index=False, start=None, end=None
+    ):
         """
         Generate a union KQL query that combines the individual queries into one.
 
+        Each table query filters the time window first and projects the
+        displayed columns before the union.
+
         Parameters
         ----------
         entity_type : str
@@ -785,11 +4031,341 @@ class EntityIdentifier:
             Value of the instance to search for.
         cols : [str]
             Columns to be displayed.
+        use_index : bool, optional
+            If True, skips columns that the value index or column filters rule out, by default False
+        start : datetime, optional
+            Start of the time window, by default None (unbounded)
+        end : datetime, optional
+            End of the time window, by default None (unbounded)
 
         Returns
         -------
-        str
-            Union query.
+        Optional[str]
+            Union query, None if use_index rules out every table.
         """
-        queries = self.generate_table_queries(entity_type, search_value)
+        queries = self.generate_table_queries(
+            entity_type, search_value, use_index=use_index, start=start, end=end, cols=cols
+        )
         return self.format_union_query(queries, cols)
+
+
+    def generate_sliced_union_queries(
+        self,
+        entity_type: str,
+        search_value: str,
+        cols,
+        start,
+        end,
+        slice_size="1d",
+        use_index=False,
+    ):
+        """
+        Generate one union query per time slice of the time window, see generate_union_query.
+
+        Parameters
+        ----------
+        entity_type : str
+            Entity of the particular value to search for
+        search_value : str
+            Value of the instance to search for.
+        cols : [str]
+            Columns to be displayed.
+        start : datetime or str
+            Start of the time window.
+        end : datetime or str
+            End of the time window.
+        slice_size : timedelta or str, optional
+            Duration of each slice, by default "1d"
+        use_index : bool, optional
+            If True, skips columns that the value index or column filters rule out, by default False
+
+        Returns
+        -------
+        List[str]
+            Union queries in time order, for run_sliced_queries. Empty if
+            use_index rules out every table.
+        """
+        queries = [
+            self.generate_union_query(
+                entity_type, search_value, cols, use_index, slice_start, slice_end
+            )
+            for slice_start, slice_end in time_slices(start, end, slice_size)
+        ]
+        return [query for query in queries if query is not None]
+
+
+    def run_sliced_queries(
+        self, queries: List[str], max_workers=4, timeout=None, max_results=None, newest_first=True
+    ):
+        """
+        Run the time slice queries in parallel and merge their results in time order.
+
+        Slices are started from the newest (or oldest) one. Once the finished
+        slices next to it hold max_results rows, the remaining slices are
+        cancelled. Slices that fail or time out are left out, so the result
+        may be partial, see query_stats.
+
+        Parameters
+        ----------
+        queries : List[str]
+            Output of generate_sliced_union_queries, in time order.
+        max_workers : int, optional
+            Number of slices to query concurrently, by default 4
+        timeout : float, optional
+            Seconds after which a slice query is abandoned, by default None (no timeout)
+        max_results : int, optional
+            Number of rows after which to stop, by default None (all slices)
+        newest_first : bool, optional
+            If True, starts with the newest slice and returns the newest rows,
+            by default True
+
+        Returns
+        -------
+        DataFrame
+            Rows of the finished slices in time order, at most max_results rows.
+        """
+        ordered = list(reversed(queries)) if newest_first else list(queries)
+        results = {}
+        query_results = self.iter_query_results(ordered, max_workers, timeout)
+        try:
+            for query, query_result in query_results:
+                results[query] = query_result
+                if max_results is None:
+                    continue
+                finished = {stat["query"] for stat in self.query_stats}
+                num_rows = 0
+                for slice_query in ordered:
+                    if slice_query not in finished:
+                        break
+                    num_rows += len(results.get(slice_query, ()))
+                if num_rows >= max_results:
+                    break
+        finally:
+            query_results.close()
+        frames = [results[query] for query in queries if query in results]
+        if not frames:
+            return pd.DataFrame()
+        merged = pd.concat(frames, ignore_index=True)
+        if "TimeGenerated" in merged.columns:
+            merged = merged.sort_values("TimeGenerated", kind="stable", ignore_index=True)
+        if max_results is not None and len(merged) > max_results:
+            merged = merged.tail(max_results) if newest_first else merged.head(max_results)
+        return merged.reset_index(drop=True)
+
+
+    def generate_batch_union_query(
+        self,
+        entity_type: str,
+        search_values: List[str],
+        cols=None,
+        use_index=False,
+        max_query_length=MAX_QUERY_LENGTH,
+        datatable_threshold=DATATABLE_THRESHOLD,
+    ):
+        """
+        Generate union KQL queries searching every column of an entity for many values at once.
+
+        The values are matched case-insensitively with in~, or by joining a
+        datatable of the values if there are more than datatable_threshold.
+        The values are split over several queries to keep every query under
+        max_query_length characters. Result rows are tagged with their source
+        table, matched column and matched value (see MATCH_SOURCE_COLS).
+
+        Parameters
+        ----------
+        entity_type : str
+            Entity of the values to search for
+        search_values : List[str]
+            Values to search for.
+        cols : [str], optional
+            Columns to be displayed in addition to the match columns, by default all columns
+        use_index : bool, optional
+            If True, skips columns that the value index or column filters rule out
+            for all of the values in a query, by default False
+        max_query_length : int, optional
+            Maximum query length in characters, by default MAX_QUERY_LENGTH
+        datatable_threshold : int, optional
+            Number of values above which a datatable join is used, by default DATATABLE_THRESHOLD
+
+        Returns
+        -------
+        List[str]
+            Union queries, empty if no column can contain the values.
+        """
+        columns = self.entity_map.get(entity_type, [])
+        # in~ is case-insensitive so values differing only in case are searched once
+        unique_values = list(
+            {value.casefold(): value for value in reversed(search_values)}.values()
+        )[::-1]
+        values = [
+            value
+            for value in unique_values
+            if any(not self._ruled_out(table, col, value, use_index) for table, col in columns)
+        ]
+        if not values:
+            return []
+        use_datatable = len(values) > datatable_threshold
+        if use_datatable:
+            # Lower case as in the query, so the chunk lengths are exact
+            values = [value.lower() for value in values]
+        # Everything but the value literals
+        overhead = len(batch_pivot_query(columns, [], cols, use_datatable))
+        queries = []
+        for chunk in chunk_values(values, max_query_length - overhead):
+            chunk_columns = [
+                (table, col)
+                for table, col in columns
+                if any(not self._ruled_out(table, col, value, use_index) for value in chunk)
+            ]
+            queries.append(batch_pivot_query(chunk_columns, chunk, cols, use_datatable))
+        return queries
+
+
+class MultiWorkspaceIdentifier:
+    """Class for identifying entities in the tables of several Azure Sentinel workspaces."""
+
+    def __init__(self, providers: Dict[str, object], **kwargs):
+        """
+        Instantiate an EntityIdentifier for each workspace.
+
+        Parameters
+        ----------
+        providers : Dict[str, msticpy.data.data_providers.QueryProvider]
+            Authenticated query providers keyed by workspace name.
+        kwargs :
+            Other EntityIdentifier parameters, e.g. regex_engine.
+        """
+        self.identifiers = {
+            workspace: EntityIdentifier(qry_prov, **kwargs)
+            for workspace, qry_prov in providers.items()
+        }
+        # match results store of all workspaces, MATCH_COLUMNS and a workspace column
+        self.matches = pd.DataFrame(columns=["workspace", *MATCH_COLUMNS])
+
+
+    def detect_entities(self, tables=None, max_workspaces=4, **kwargs):
+        """
+        Run detect_entities on every workspace concurrently.
+
+        Tables with the same name and schema in several workspaces are only
+        sampled in one of them, and the results are reused for the others.
+
+        Parameters
+        ----------
+        tables : List[str], optional
+            Tables to scan in each workspace (if they exist), by default all tables
+        max_workspaces : int, optional
+            Number of workspaces scanned concurrently, by default 4
+        kwargs :
+            Other EntityIdentifier.detect_entities parameters, e.g. sample_size.
+            A cache_path should not be shared by the workspaces.
+
+        Returns
+        -------
+        Dict
+            Dict structure is {entity: [(workspace, table, column)]}.
+        """
+        workspace_tables = {
+            workspace: [
+                table
+                for table in identifier.qry_prov.schema
+                if tables is None or table in tables
+            ]
+            for workspace, identifier in self.identifiers.items()
+        }
+        assigned = self._assign_tables(workspace_tables)
+        with ThreadPoolExecutor(max_workers=max_workspaces) as executor:
+            futures = {
+                executor.submit(
+                    self.identifiers[workspace].detect_entities, list(scan_tables), **kwargs
+                ): workspace
+                for workspace, scan_tables in assigned.items()
+                if scan_tables
+            }
+            for future in as_completed(futures):
+                future.result()
+        scanned = {}
+        for workspace, scan_tables in assigned.items():
+            if not scan_tables:
+                continue
+            regex_matches = self.identifiers[workspace]._regex_matches
+            for table, key in scan_tables.items():
+                scanned[key] = regex_matches.get(table, {})
+        frames = []
+        for workspace, identifier in self.identifiers.items():
+            identifier._regex_matches = {
+                table: scanned[self._table_key(workspace, table)]
+                for table in workspace_tables[workspace]
+            }
+            frames.append(identifier.matches.assign(workspace=workspace))
+        self.matches = pd.concat(frames, ignore_index=True)[["workspace", *MATCH_COLUMNS]]
+        self.matches = self.matches.astype(
+            {
+                "workspace": pd.CategoricalDtype(list(self.identifiers)),
+                "table": "category",
+                "column": "category",
+                "regex": "category",
+                "entity": "category",
+            }
+        )
+        return self.entity_map
+
+
+    def _table_key(self, workspace, table):
+        """Return the key of tables sharing their results, the name and schema hash."""
+        identifier = self.identifiers[workspace]
+        if not identifier.qry_prov.schema.get(table):
+            # Without a schema the results can't be shared
+            return workspace, table
+        return table, identifier._schema_hash(table)
+
+
+    def _assign_tables(self, workspace_tables):
+        """
+        Pick the workspace scanning each distinct table.
+
+        Returns
+        -------
+        Dict[str, Dict[str, Tuple]]
+            {workspace: {table: key}}, each key is assigned to the workspace
+            with the fewest assigned tables.
+        """
+        assigned = {workspace: {} for workspace in workspace_tables}
+        seen = set()
+        for workspace, tables in workspace_tables.items():
+            for table in tables:
+                key = self._table_key(workspace, table)
+                if key in seen:
+                    continue
+                seen.add(key)
+                candidates = [
+                    other
+                    for other, other_tables in workspace_tables.items()
+                    if table in other_tables and self._table_key(other, table) == key
+                ]
+                target = min(candidates, key=lambda other: len(assigned[other]))
+                assigned[target][table] = key
+        return assigned
+
+
+    @property
+    def entity_map(self) -> Dict[str, List[Tuple[str, str, str]]]:
+        """Reverse mapping from entities to workspace/table/column, {entity: [(workspace, table, col)]}."""
+        entity_map = {}
+        for workspace, identifier in self.identifiers.items():
+            for entity, pairs in identifier.entity_map.items():
+                entity_map.setdefault(entity, []).extend(
+                    (workspace, table, col) for table, col in pairs
+                )
+        return entity_map
+
+
+    @property
+    def column_entities(self) -> Dict[Tuple[str, str, str], str]:
+        """Entity of each column, dict structure is {(workspace, table, column): entity}."""
+        return {
+            (workspace, table, col): entity
+            for workspace, identifier in self.identifiers.items()
+            for table, cols in identifier.table_map.items()
+            for col, entity in cols.items()
+        }
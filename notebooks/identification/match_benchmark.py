@@ -0,0 +1,132 @@
+"""
+Before/after timing of search_single_table on the static/pickles tables.
+
+"before" is the original implementation, which passes every raw regex
+string to Series.str.match for every column. "after" is the current
+EntityIdentifier.search_single_table with the compiled regex registry
+(and the later optimizations, e.g. the prefilters).
+With --mode both, the match ratios of the two are also compared.
+
+Usage::
+
+    python match_benchmark.py [--mode both] [--repeat 1] [--tables SigninLogs ...]
+"""
+import argparse
+import math
+import re
+import time
+from pathlib import Path
+from typing import Dict
+
+import pandas as pd
+
+from entity_id import DEF_REGEXES, EntityIdentifier
+
+
+PICKLES_PATH = Path(__file__).resolve().parents[2] / "static" / "pickles"
+
+
+class PickleProvider:
+    """Query provider returning the pickled tables, so the benchmark runs offline."""
+
+    def __init__(self, tables: Dict[str, pd.DataFrame]):
+        """Instantiate the provider with {table: DataFrame}."""
+        self.tables = tables
+        self.schema = {
+            table: {col: str(dtype) for col, dtype in data.dtypes.items()}
+            for table, data in tables.items()
+        }
+
+    def exec_query(self, query: str, **kwargs):
+        """Return the whole table named at the start of the query."""
+        del kwargs
+        return self.tables[query.split("|")[0].strip()]
+
+
+def search_single_table_before(table: pd.DataFrame, regexes: Dict) -> Dict:
+    """
+    Apply every regex to every column, as search_single_table did before compiling the regexes.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Tuple(float, float)]]
+        {column: {regex: (non-blank-matches, all-matches)}}
+    """
+    full_matches = {}
+    for col in table.columns:
+        if len(table[col]) < 1 or not isinstance(table[col][0], str):
+            continue
+        for name, regex in regexes.items():
+            match_series = table[col].str.match(regex["regex"], case=False, flags=re.VERBOSE)
+            total_match_ratio = match_series.sum() / len(match_series)
+            blanks_df = table[col].str.strip() == ""
+            num_non_blanks = len(match_series) - blanks_df.sum()
+            match_ratio = (
+                match_series.sum() / num_non_blanks if num_non_blanks > 0 else total_match_ratio
+            )
+            if total_match_ratio > 0:
+                full_matches.setdefault(col, {})[name] = match_ratio, total_match_ratio
+    return full_matches
+
+
+def _same_matches(before: Dict, after: Dict) -> bool:
+    """Return True if both results have the same regexes and ratios."""
+    if before.keys() != after.keys():
+        return False
+    return all(
+        before[col].keys() == after[col].keys()
+        and all(
+            math.isclose(b, a)
+            for name in before[col]
+            for b, a in zip(before[col][name], after[col][name])
+        )
+        for col in before
+    )
+
+
+def _time(func, repeat: int) -> float:
+    """Return the best time in seconds of repeat calls."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    """Print the timing table."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mode", choices=["before", "after", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=1, help="number of timed runs, the best is shown")
+    parser.add_argument("--tables", nargs="+", help="pickled tables, by default all")
+    args = parser.parse_args()
+
+    tables = {
+        path.stem: pd.read_pickle(path).reset_index(drop=True)
+        for path in sorted(PICKLES_PATH.glob("*.pkl"))
+        if not args.tables or path.stem in args.tables
+    }
+    identifier = EntityIdentifier(PickleProvider(tables))
+    modes = ["before", "after"] if args.mode == "both" else [args.mode]
+    header = "".join(f"{mode:>10}" for mode in modes)
+    print(f"{'table':20}{'rows':>8}{header}" + ("  identical" if args.mode == "both" else ""))
+    totals = dict.fromkeys(modes, 0.0)
+    for name, table in tables.items():
+        results, line = {}, f"{name:20}{len(table):>8}"
+        for mode in modes:
+            if mode == "before":
+                func = lambda: results.update(before=search_single_table_before(table, DEF_REGEXES))
+            else:
+                func = lambda: results.update(after=identifier.search_single_table(table))
+            seconds = _time(func, args.repeat)
+            totals[mode] += seconds
+            line += f"{seconds:9.2f}s"
+        if args.mode == "both":
+            line += f"  {_same_matches(results['before'], results['after'])}"
+        print(line)
+    print(f"{'total':28}" + "".join(f"{totals[mode]:9.2f}s" for mode in modes))
+
+
+if __name__ == "__main__":
+    main()
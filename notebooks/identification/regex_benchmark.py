@@ -0,0 +1,116 @@
+"""
+Worst-case timing of the DEF_REGEXES patterns on adversarial inputs.
+
+Each regex is matched against a set of input families built to trigger
+backtracking (long repeats of the characters the patterns accept, ending
+with a character that makes the match fail). The slowest input of each
+regex is reported for every available regex engine, followed by the
+growth of URL_REGEX with the number of "%20" in the URL path.
+
+Usage::
+
+    python regex_benchmark.py [--length 20000] [--engines re re2]
+"""
+import argparse
+import time
+from typing import Callable, Dict, List, Tuple
+
+from entity_id import DEF_REGEXES, compile_regexes
+
+
+# Adversarial input families, each building an input of about n characters
+INPUT_FAMILIES: Dict[str, Callable[[int], str]] = {
+    "a.": lambda n: "a." * (n // 2) + "!",
+    "a-": lambda n: "a-" * (n // 2) + "!",
+    "1.": lambda n: "1." * (n // 2) + "x",
+    "/a": lambda n: "/a" * (n // 2) + "|",
+    "\\a": lambda n: "\\a" * (n // 2) + "*",
+    "c:\\a": lambda n: "c:" + "\\a" * (n // 2) + "*",
+    "a*": lambda n: "a" * n + "!",
+    "%20": lambda n: "http://" + "%20" * (n // 3) + '"',
+    "url/": lambda n: "http://a/" + "a/" * (n // 2) + " x",
+    "a@": lambda n: "a@" + "a." * (n // 2) + "!",
+    ":": lambda n: ":" * n + "g",
+    "S-1": lambda n: "S" + "-1" * (n // 2) + "x",
+    "hk": lambda n: "HKLM" + "\\a" * (n // 2) + '"/',
+    "ab\\": lambda n: "a" * 15 + "\\" + "a" * n,
+    "hex": lambda n: "a" * n + "g",
+    "guid": lambda n: "a" * 8 + "-aaaa" * (n // 5),
+    # URL_REGEX backtracks exponentially, so this one is kept short
+    "url%": lambda n: "http://a/" + "%20" * 22 + '"',
+}
+
+
+def _time_match(regex, value: str) -> float:
+    """Return the time in ms of one match call."""
+    start = time.perf_counter()
+    regex.match(value)
+    return (time.perf_counter() - start) * 1000
+
+
+def worst_cases(engines: Dict[str, Dict], length: int = 20000) -> List[Tuple]:
+    """
+    Return the slowest input of each regex.
+
+    Parameters
+    ----------
+    engines : Dict[str, Dict]
+        Compiled regexes of each engine {engine: {regex name: regex}}.
+    length : int, optional
+        Approximate length of the adversarial inputs, by default 20000
+
+    Returns
+    -------
+    List[Tuple]
+        (regex name, input family, ms for each engine), slowest first.
+    """
+    inputs = {family: build(length) for family, build in INPUT_FAMILIES.items()}
+    results = []
+    for name in DEF_REGEXES:
+        timings = [
+            (
+                [_time_match(compiled[name], value) for compiled in engines.values()],
+                family,
+            )
+            for family, value in inputs.items()
+        ]
+        times, family = max(timings)
+        results.append((name, family, *times))
+    return sorted(results, key=lambda result: -max(result[2:]))
+
+
+def url_growth(engines: Dict[str, Dict], repeats=(10, 14, 18, 20, 22)) -> List[Tuple]:
+    """Return (number of "%20", input length, ms for each engine) of URL_REGEX."""
+    results = []
+    for count in repeats:
+        value = "http://a/" + "%20" * count + '"'
+        times = [_time_match(compiled["URL_REGEX"], value) for compiled in engines.values()]
+        results.append((count, len(value), *times))
+    return results
+
+
+def main():
+    """Print the worst-case and URL_REGEX growth tables."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--length", type=int, default=20000, help="length of the inputs")
+    parser.add_argument("--engines", nargs="+", default=["re", "re2"], help="regex engines")
+    args = parser.parse_args()
+
+    engines = {}
+    for engine in args.engines:
+        try:
+            engines[engine] = compile_regexes(DEF_REGEXES, engine=engine)
+        except ImportError as err:
+            print(f"warning: skipping the {engine} engine: {err}")
+    header = "".join(f"{engine + ' (ms)':>12}" for engine in engines)
+    print(f"{'regex':18}{'worst input':>12}{header}")
+    for name, family, *times in worst_cases(engines, args.length):
+        print(f"{name:18}{family:>12}" + "".join(f"{ms:12.1f}" for ms in times))
+    print()
+    print(f"{'%20 count':>10}{'length':>8}{header}")
+    for count, length, *times in url_growth(engines):
+        print(f"{count:>10}{length:>8}" + "".join(f"{ms:12.1f}" for ms in times))
+
+
+if __name__ == "__main__":
+    main()
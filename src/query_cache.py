@@ -0,0 +1,288 @@
+"""Disk-backed cache of Azure Sentinel query results."""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+
+# Freshness of the cached results of each query class, in seconds. Classes with
+# a TTL of 0 are not cached: "sample" returns different rows on every run, and
+# e.g. detect_entities_adaptive resamples with the same query text
+DEFAULT_TTLS = {"sample": 0, "take": 86400, "summarize": 3600, "pivot": 900}
+
+# Seconds after which a left over index lock file is considered stale
+LOCK_TIMEOUT = 30
+
+_STRING_LITERAL = re.compile(r"""("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')""")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Return the query with comments removed and whitespace collapsed.
+
+    String literals are kept unchanged.
+    """
+    parts = _STRING_LITERAL.split(query)
+    for idx in range(0, len(parts), 2):
+        text = re.sub(r"//[^\n]*", "", parts[idx])
+        parts[idx] = re.sub(r"\s+", " ", text)
+    return "".join(parts).strip()
+
+
+def classify_query(query: str) -> str:
+    """Return the query class used to look up the freshness TTL."""
+    if re.search(r"\|\s*sample\b", query):
+        return "sample"
+    if re.search(r"\|\s*(take|limit)\b", query):
+        return "take"
+    if re.search(r"\|\s*summarize\b", query):
+        return "summarize"
+    return "pivot"
+
+
+class QueryCache:
+    """
+    Cache of query results stored as Parquet files.
+
+    Entries are keyed on the normalized query text and the query
+    parameters (e.g. the start and end of the time window). Entries expire
+    after the TTL of their query class and the least recently used entries
+    (by the modification time of their file, updated on every hit) are
+    evicted once the files exceed max_bytes. The cache directory can be
+    shared by several providers and processes. Updates of the index are
+    serialized with a lock file, lookups take no lock.
+
+    Object columns holding dicts or lists (dynamic columns) are stored as
+    JSON text and decoded when read, so cached results equal live results.
+    """
+
+    def __init__(
+        self,
+        path: str = "./query_cache",
+        max_bytes: int = 1024 ** 3,
+        ttls: Optional[Dict[str, float]] = None,
+        classify: Callable[[str], str] = classify_query,
+    ):
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        path : str, optional
+            Cache directory, by default "./query_cache"
+        max_bytes : int, optional
+            Maximum total size of the cached files, by default 1 GiB
+        ttls : Dict[str, float], optional
+            Freshness TTL in seconds of each query class, 0 disables caching the
+            class, by default DEFAULT_TTLS
+        classify : Callable[[str], str], optional
+            Function returning the class of a query, by default classify_query
+
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.classify = classify
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query: str, **kwargs) -> str:
+        """Return the cache key of a query and its parameters."""
+        params = json.dumps(kwargs, sort_keys=True, default=str)
+        text = f"{normalize_query(query)}\n{params}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, query: str, **kwargs) -> Optional[pd.DataFrame]:
+        """Return the cached result of a query, or None if it is missing or stale."""
+        key = self.key(query, **kwargs)
+        file = self.path / f"{key}.parquet"
+        # The index is replaced atomically, so it can be read without the lock
+        entry = self._read_index().get(key)
+        ttl = self.ttls.get(entry["class"], 0) if entry else 0
+        try:
+            if entry is None or time.time() - entry["created"] > ttl:
+                raise LookupError(key)
+            data = pd.read_parquet(file)
+            # The file modification time is the last use of the entry
+            os.utime(file)
+        except (LookupError, OSError, ValueError):
+            # Missing, stale, or evicted by another cache instance meanwhile
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        for col in entry.get("json_columns", []):
+            data[col] = data[col].map(
+                lambda value: json.loads(value) if isinstance(value, str) else value
+            )
+        return data
+
+    def put(self, query: str, data: pd.DataFrame, **kwargs):
+        """Store the result of a query, results that can't be stored as Parquet are skipped."""
+        query_class = self.classify(query)
+        if self.ttls.get(query_class, 0) <= 0:
+            return
+        key = self.key(query, **kwargs)
+        file = self.path / f"{key}.parquet"
+        json_columns = _nested_columns(data)
+        if json_columns:
+            data = data.copy()
+            for col in json_columns:
+                data[col] = data[col].map(
+                    lambda value: value if _is_null(value) else json.dumps(value, default=str)
+                )
+        try:
+            data.to_parquet(file)
+        except Exception:  # pylint: disable=broad-except
+            # e.g. object columns mixing numbers and strings
+            file.unlink(missing_ok=True)
+            return
+        now = time.time()
+        with self._index_lock():
+            index = self._read_index()
+            index[key] = {
+                "class": query_class,
+                "bytes": file.stat().st_size,
+                "created": now,
+                "json_columns": json_columns,
+            }
+            self._evict(index)
+            self._write_index(index)
+
+    def clear(self):
+        """Remove every cached result."""
+        with self._index_lock():
+            for key in self._read_index():
+                (self.path / f"{key}.parquet").unlink(missing_ok=True)
+            self._write_index({})
+
+    @contextmanager
+    def _index_lock(self):
+        """Hold the index lock of this process and of the lock file shared with other processes."""
+        lock_file = self.path / "index.lock"
+        with self._lock:
+            while True:
+                try:
+                    os.close(os.open(lock_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                    break
+                except FileExistsError:
+                    try:
+                        # Remove the lock of a process that died while holding it
+                        if time.time() - lock_file.stat().st_mtime > LOCK_TIMEOUT:
+                            lock_file.unlink(missing_ok=True)
+                    except FileNotFoundError:
+                        pass
+                    time.sleep(0.01)
+            try:
+                yield
+            finally:
+                lock_file.unlink(missing_ok=True)
+
+    def _evict(self, index: Dict[str, Dict]):
+        """Remove expired entries, then least recently used entries over max_bytes."""
+        now = time.time()
+        for key, entry in list(index.items()):
+            if now - entry["created"] > self.ttls.get(entry["class"], 0):
+                self._remove(index, key)
+        total = sum(entry["bytes"] for entry in index.values())
+        for key in sorted(index, key=lambda key: self._last_used(key, index[key])):
+            if total <= self.max_bytes:
+                break
+            total -= index[key]["bytes"]
+            self._remove(index, key)
+
+    def _last_used(self, key: str, entry: Dict) -> float:
+        """Return the last use time of an entry, the modification time of its file."""
+        try:
+            return (self.path / f"{key}.parquet").stat().st_mtime
+        except OSError:
+            return entry["created"]
+
+    def _remove(self, index: Dict[str, Dict], key: str):
+        """Remove a cache entry and its file."""
+        (self.path / f"{key}.parquet").unlink(missing_ok=True)
+        del index[key]
+
+    def _read_index(self) -> Dict[str, Dict]:
+        """Read the cache index, shared with other cache instances."""
+        index_file = self.path / "index.json"
+        if not index_file.is_file():
+            return {}
+        try:
+            with open(index_file) as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _write_index(self, index: Dict[str, Dict]):
+        """Atomically replace the cache index."""
+        tmp_file = self.path / f"index.json.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(index, f)
+        tmp_file.replace(self.path / "index.json")
+
+
+def _is_null(value) -> bool:
+    """Return True for None and NaN values."""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _nested_columns(data: pd.DataFrame) -> List[str]:
+    """Return the object columns holding dicts or lists."""
+    return [
+        col
+        for col in data.columns
+        if data[col].dtype == object
+        and data[col].map(lambda value: isinstance(value, (dict, list))).any()
+    ]
+
+
+class CachedQueryProvider:
+    """
+    Query provider wrapper answering repeated queries from a QueryCache.
+
+    Can be used wherever a query provider is expected, e.g.
+    EntityIdentifier(CachedQueryProvider(qry_prov, cache)) or
+    get_table_variability(CachedQueryProvider(qry_prov, cache)).
+    Other attributes (e.g. schema) are passed through to the provider.
+    """
+
+    def __init__(self, qry_prov, cache: QueryCache):
+        """
+        Initialize the wrapper.
+
+        Parameters
+        ----------
+        qry_prov : QueryProvider
+            Azure Sentinel query provider.
+        cache : QueryCache
+            Query result cache, can be shared by several providers.
+
+        """
+        self.qry_prov = qry_prov
+        self.cache = cache
+
+    def exec_query(self, query: str, **kwargs):
+        """Return the cached result of the query, or run it and cache its result."""
+        data = self.cache.get(query, **kwargs)
+        if data is not None:
+            return data
+        data = self.qry_prov.exec_query(query, **kwargs)
+        if isinstance(data, pd.DataFrame):
+            self.cache.put(query, data, **kwargs)
+        return data
+
+    def __getattr__(self, name):
+        """Pass other attributes through to the query provider."""
+        return getattr(self.qry_prov, name)
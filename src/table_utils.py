@@ -1,10 +1,15 @@
 """Utility functions for Azure Sentinel tables."""
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import pandas as pd
 from tqdm.auto import tqdm
 
 
-def get_table_variability(qry_prov, table_subset: Optional[List[str]] = None) -> Dict[str, str]:
+def get_table_variability(
+    qry_prov,
+    table_subset: Optional[List[str]] = None,
+    batch_size: int = 1,
+    sampler: Optional[Callable[..., Iterable[Tuple[str, pd.DataFrame]]]] = None,
+) -> Dict[str, str]:
     """
     Return column variability for each table in the schema.
 
@@ -12,6 +17,15 @@ def get_table_variability(qry_prov, table_subset: Optional[List[str]] = None) ->
     ----------
     qry_prov: QueryProvider
         Azure Sentinel query provider.
+    table_subset: Optional[List[str]]
+        Tables to check, by default all tables in the schema.
+    batch_size: int
+        Number of tables sampled by a single union query, passed to sampler, by default 1.
+    sampler: Optional[Callable]
+        Function called as sampler(qry_prov, tables, batch_size=batch_size) and
+        returning (table, sampled rows) pairs, e.g. entity_id.sample_tables to
+        sample batches of tables with union queries. By default each table is
+        sampled with its own query.
 
     Returns
     -------
@@ -28,22 +42,35 @@ def get_table_variability(qry_prov, table_subset: Optional[List[str]] = None) ->
     Get the column variability for tables listed in the provider
     >>> table_results = get_table_variability(qry_prov)
 
+    Sample 20 tables per query
+    >>> table_results = get_table_variability(qry_prov, batch_size=20, sampler=eid.sample_tables)
+
     """
     if not table_subset:
         print("warning: long-running function...")
     table_results = {}
 
-    for table in tqdm(qry_prov.schema, unit="table"):
-        if table_subset and table not in table_subset:
-            continue
-        data = qry_prov.exec_query(f"{table} | sample 100")
-        if data.empty:
-            table_results[table] = "no_data"
-            continue
-        col_var = _col_variability(data)
-        table_results[table] = "variable" if col_var > 1 else "constant"
+    tables = [
+        table for table in qry_prov.schema
+        if not table_subset or table in table_subset
+    ]
+    sampler = sampler or _sample_each
+    with tqdm(total=len(tables), unit="table") as progress:
+        for table, data in sampler(qry_prov, tables, batch_size=batch_size):
+            progress.update()
+            if data.empty:
+                table_results[table] = "no_data"
+                continue
+            col_var = _col_variability(data)
+            table_results[table] = "variable" if col_var > 1 else "constant"
     return table_results
-        
+
+
+def _sample_each(qry_prov, tables: List[str], batch_size: int = 1):
+    """Yield a sample of 100 rows of each table, queried one table at a time."""
+    del batch_size
+    for table in tables:
+        yield table, qry_prov.exec_query(f"{table} | sample 100")
 
 
 def _get_groupings(input_df):